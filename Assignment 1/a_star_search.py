@@ -1,31 +1,132 @@
 import queue
+import time
 import numpy as np
-from search_problems import Node, GridSearchProblem, get_random_grid_problem
-# import matplotlib.pyplot as plt
+from search_problems import Node, GridSearchProblem, get_random_grid_problem, node_path, parent_path
+from indexed_heap import IndexedMinHeap, SparseIndexedMinHeap
+from instrumentation import NULL_STATS
 
+MAX_DENSE_HEAP_STATES = 1 << 23 # larger grids get a SparseIndexedMinHeap instead of grid-sized flat lists
 
-def a_star_search(problem):
+
+def a_star_search(problem, stats=NULL_STATS, heap=None):
     """
     Uses the A* algorithm to solve an instance of GridSearchProblem. Use the methods of GridSearchProblem along with
     structures and functions from the allowed imports (see above) to implement A*.
 
+    The frontier is an IndexedMinHeap keyed by state: a cheaper path to an open state lowers its key instead of adding
+    a duplicate, and ties in f are broken toward the larger g. The path costs, parents and closed set only hold the
+    states the search touches and the heuristic is computed when a state is first generated. The heap's flat arrays
+    span the grid; a caller answering many queries on one grid can make one with new_heap and pass it to every search,
+    which leaves it empty, so that a query whose goal is close by costs time in the size of its search rather than in
+    the size of the grid. Grids of more than MAX_DENSE_HEAP_STATES states use a SparseIndexedMinHeap, so nothing
+    grid-sized is allocated at all.
+
+    With several goal states the heuristic is the Manhattan distance to the nearest goal (see
+    GridSearchProblem.heuristic), which stays consistent, so the first goal popped is the nearest one by path cost.
+
     :param problem: an instance of GridSearchProblem to solve
-    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+    :param stats: SearchStats to report counters, phase times and frontier sizes into (see instrumentation)
+    :param heap: empty heap from new_heap(problem.M * problem.N) to use for the frontier (None makes one for this call)
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest goal state
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search (number of distinct open states)
+    """
+    stats.begin('a_star_search')
+    problem = stats.wrap(problem) # times the heuristic calls when stats is enabled
+    instrumented = stats.enabled
+
+    # sets the intial goal state and initial state
+    state = problem.init_state
+    if problem.goal_test(state):
+        stats.end()
+        return [state], 0, 0
+
+    # initializes all of the variables and data structures needed for the search
+    successors = problem.neighbour_table # precomputed successor table of the grid
+    goal_states = problem.goal_set
+    heuristic = problem.heuristic
+    frontier = new_heap(problem.M * problem.N) if heap is None else heap # open states ordered by (f, -g)
+    frontier.push(state, heuristic(state), 0)
+    best_cost = {state: 0} # cheapest path cost found so far for every state reached
+    parent = {state: -1}
+    closed = set()
+    max_frontier_size = 0
+    num_nodes_expanded = 0
+    num_nodes_generated = 0
+    num_pushes = 1
+    path = []
+
+    while len(frontier) != 0: # loops until the frontier is empty --> no solution to the problem
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        if instrumented:
+            stats.sample_frontier(num_nodes_expanded, len(frontier))
+        node = frontier.pop() # gets the state with the smallest cost
+        if node in goal_states:
+            path = parent_path(parent, node)
+            break
+        num_nodes_expanded += 1
+        closed.add(node)
+        cost = best_cost[node]
+        for child in successors[node].tolist(): # gets all of the states reachable from the node
+            if child < 0:
+                continue # move blocked by an obstacle or the edge of the grid
+            num_nodes_generated += 1
+            child_cost = cost + problem.action_cost(node, (node, child), child)
+            if child in closed:
+                continue
+            previous_cost = best_cost.get(child)
+            if previous_cost is None: # first time the state is reached
+                h = heuristic(child)
+            elif child_cost < previous_cost: # cheaper path to an open state: its heuristic is f - g in the heap
+                h = frontier.f[child] - previous_cost
+            else:
+                continue # only keep the cheapest path to an open state
+            best_cost[child] = child_cost
+            parent[child] = node
+            frontier.push(child, child_cost + h, child_cost) # inserts or decreases the key
+            num_pushes += 1
+
+    # every push either inserted a state (popped later or still open) or lowered the key of an open one
+    num_pops = num_nodes_expanded + (len(path) != 0)
+    stats.end(expanded=num_nodes_expanded, generated=num_nodes_generated,
+              duplicates=num_nodes_generated - num_pushes + 1, heap_push=num_pushes, heap_pop=num_pops,
+              decrease_key=num_pushes - num_pops - len(frontier))
+    if heap is not None:
+        frontier.clear() # the caller's heap is left empty for its next search
+    return path, num_nodes_expanded, max_frontier_size
+
+
+def new_heap(capacity):
+    # Empty frontier heap over capacity ids: flat lists up to MAX_DENSE_HEAP_STATES ids, dicts beyond
+    if capacity > MAX_DENSE_HEAP_STATES:
+        return SparseIndexedMinHeap()
+    return IndexedMinHeap(capacity)
+
+
+def priority_queue_a_star_search(problem):
+    """
+    Previous A* implementation based on queue.PriorityQueue, which pushes a duplicate entry every time a cheaper path to
+    a state is found. Kept as the baseline for compare_frontiers.
+
+    :param problem: an instance of GridSearchProblem to solve
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest goal state
              num_nodes_expanded: number of nodes expanded by your search
              max_frontier_size: maximum frontier size during search
     """
     # sets the intial goal state and initial state
-    goal_state = problem.goal_states[0]
+    goal_states = problem.goal_set
     state = problem.init_state
 
     # initializes all of the variables and data structures needed for the search
     node = Node(None,state,None,0)
-    if goal_state == node.state:
+    if node.state in goal_states:
         return [state], 0, 0
     frontier = queue.PriorityQueue() # intializes the frontier of the priority queue
     frontier.put((0,node)) # priority queue will store the path cost and the node as a tuple
     explored = {}
     explored[node.state] = 0 # initializes explored dictionary
+    successors = problem.neighbour_table # precomputed successor table of the grid
+    heuristics = problem.batch_heuristic(np.arange(problem.M*problem.N)) # all heuristics in one call
     path = False
     max_frontier_size = 0
     num_nodes_expanded = 0
@@ -35,63 +136,51 @@ def a_star_search(problem):
             return [], num_nodes_expanded, max_frontier_size # if frontier is empty --> no solution to the problem
         max_frontier_size = max(max_frontier_size,frontier.qsize())
         node = (frontier.get())[1] # gets the node with the smallest cost
-        if node.state == goal_state:
+        if node.state in goal_states:
             break
-        actions = problem.get_actions(node.state) # gets all of the actions associated with the node
-        for action in actions:
-            num_nodes_expanded += 1
-            child = problem.get_child_node(node,action) # gets child associated with the actions
+        num_nodes_expanded += 1
+        for child_state in successors[node.state].tolist(): # gets all of the states reachable from the node
+            if child_state < 0:
+                continue # move blocked by an obstacle or the edge of the grid
+            action = (node.state, child_state)
+            child = Node(node, child_state, action, node.path_cost + problem.action_cost(node.state, action, child_state))
             if child.state not in explored or explored[child.state] > child.path_cost: # if the child has not been explored yet or if it has and has a higher path cost than what is already in the dictionary
-                f = child.path_cost + problem.manhattan_heuristic(child.state,goal_state) # determines the path cost with the heuristic
+                f = child.path_cost + heuristics.item(child_state) # determines the path cost with the heuristic
                 frontier.put((f,child))
                 explored[child.state] = child.path_cost # updates the data structures accordingly
 
-    final_path = [] # determines the final path by working backwards --> same process as breadth and bidirectional searches
-    final_path.insert(0,goal_state)
-    parent = node.parent
-    while(True):
-        final_path.insert(0,parent.state)
-        if(parent.state == state):
-            break
-        parent = parent.parent
-
-    return final_path, num_nodes_expanded, max_frontier_size
-
-'''
-def graphs(N):
-    P = np.linspace(0.1,0.9,17)
-    nodes_generated = []
-    solved = []
-    for p in P:
-        print("Currently solving for probability " + str(p))
-        A_solved = 0
-        nodes = 0
-        for run in range(0,100,1):
-            problem = get_random_grid_problem(p,N,N)
-            path, num_nodes_expanded, max_frontier_size = a_star_search(problem)
-            if path != []:
-                A_solved = A_solved + 1
-            nodes = nodes + num_nodes_expanded
-            print("Finished run " + str(run))
-        solved.append(A_solved/(run+1))
-        nodes_generated.append(nodes/(run+1))
-    plt.plot(P,solved)
-    plt.title("Proportion of Grid Searchs Solved versus P_opp")
-    plt.xlabel("P_opp")
-    plt.ylabel("Proportion of Searches solved by A*")
-    plt.show()
-    plt.plot(P,nodes_generated)
-    plt.title("Nodes Explored versus P_opp")
-    plt.xlabel("P_opp")
-    plt.ylabel("Average Number of Nodes Expanded")
-    plt.show()
-    '''
+    return node_path(node, state), num_nodes_expanded, max_frontier_size
+
+def compare_frontiers(M, N, probabilities=np.linspace(0.1, 0.45, 8), trials=10):
+    """
+    Runs a_star_search and priority_queue_a_star_search on the same random grid problems and prints the average run
+    time, nodes expanded and maximum frontier size of each for every probability of occupancy.
+    """
+    print("p_occ   solved   heap time   queue time   heap expanded   queue expanded   heap frontier   queue frontier")
+    for p in probabilities:
+        totals = np.zeros(6)
+        solved = 0
+        for trial in range(trials):
+            problem = get_random_grid_problem(p, M, N)
+            start = time.time()
+            path, heap_expanded, heap_frontier = a_star_search(problem)
+            heap_time = time.time() - start
+            start = time.time()
+            queue_path, queue_expanded, queue_frontier = priority_queue_a_star_search(problem)
+            queue_time = time.time() - start
+            assert len(path) == len(queue_path) # both searches are optimal
+            solved += path != []
+            totals += [heap_time, queue_time, heap_expanded, queue_expanded, heap_frontier, queue_frontier]
+        totals /= trials
+        print("{:5.3f}   {:6.2f}   {:9.3f}   {:10.3f}   {:13.0f}   {:14.0f}   {:13.0f}   {:14.0f}".format(
+            p, solved / trials, *totals))
+
 
 def search_phase_transition():
     """
     Simply fill in the prob. of occupancy values for the 'phase transition' and peak nodes expanded within 0.05. You do
     NOT need to submit your code that determines the values here: that should be computed on your own machine. Simply
-    fill in the values!
+    fill in the values! (benchmark.transition_window recomputes them from a benchmark.run_sweep results file.)
 
     :return: tuple containing (transition_start_probability, transition_end_probability, peak_probability)
     """
@@ -125,6 +214,12 @@ if __name__ == '__main__':
     print("Number of Nodes Expanded: " + str(num_nodes_expanded))
     print("Max Frontier Size: " + str(max_frontier_size))
 
-    # graphs(500)
+    # compare_frontiers(500, 500)
+    # (see benchmark.py for the phase transition sweep over BFS, bidirectional search and A*)
 
-    # Experiment and compare with BFS
\ No newline at end of file
+    # Experiment and compare with BFS
+    # Nearest of many goals (e.g. depots): one search instead of one per goal
+    problem = get_random_grid_problem(p_occ, M, N, num_goals=300)
+    path, num_nodes_expanded, max_frontier_size = a_star_search(problem)
+    print("Nearest of {:} goals: path length {:}, valid {:}, {:} nodes expanded".format(
+        len(problem.goal_set), len(path), problem.check_solution(path), num_nodes_expanded))
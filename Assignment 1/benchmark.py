@@ -0,0 +1,215 @@
+import os
+import time
+import tracemalloc
+from array import array
+from multiprocessing import Pool
+import numpy as np
+from matplotlib import pyplot as plt
+from search_problems import Node, get_random_grid_problem
+from breadth_first_search import breadth_first_search
+from bidirectional_search import bidirectional_search
+from a_star_search import a_star_search
+
+SOLVERS = {'bfs': breadth_first_search, 'bidirectional': bidirectional_search, 'a_star': a_star_search}
+COLUMNS = ('solver', 'p_occ', 'M', 'N', 'trial', 'base_seed', 'seed', 'track_memory', 'solved', 'nodes_expanded',
+           'max_frontier_size', 'wall_time', 'peak_memory')
+
+
+def trial_seed(base_seed, p_occ, M, N, trial):
+    # Seed of one trial: every solver sees the same random problem for a given (p_occ, M, N, trial)
+    return int(np.random.SeedSequence([base_seed, int(round(p_occ * 1e6)), M, N, trial]).generate_state(1)[0])
+
+
+def run_trial(job):
+    """
+    Solves one seeded random grid problem with one solver.
+
+    :param job: tuple (solver, p_occ, M, N, trial, base_seed, seed, track_memory)
+    :return: dictionary with one value for every name in COLUMNS
+    """
+    solver, p_occ, M, N, trial, base_seed, seed, track_memory = job
+    np.random.seed(seed)
+    problem = get_random_grid_problem(p_occ, M, N)
+    start = time.perf_counter()
+    path, num_nodes_expanded, max_frontier_size = SOLVERS[solver](problem)
+    wall_time = time.perf_counter() - start
+    peak_memory = -1
+    if track_memory:
+        # tracing slows the search down, so memory is measured on a second run, over the problem rebuilt from the seed
+        # so that what the first run cached on it (e.g. neighbour_table) is allocated again while traced
+        np.random.seed(seed)
+        problem = get_random_grid_problem(p_occ, M, N)
+        tracemalloc.start()
+        SOLVERS[solver](problem)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'solver': solver, 'p_occ': p_occ, 'M': M, 'N': N, 'trial': trial, 'base_seed': base_seed, 'seed': seed,
+            'track_memory': track_memory, 'solved': bool(path) and problem.check_solution(path),
+            'nodes_expanded': num_nodes_expanded, 'max_frontier_size': max_frontier_size, 'wall_time': wall_time,
+            'peak_memory': peak_memory}
+
+
+def load_results(path):
+    # Columns of a results file as a dictionary of numpy arrays (empty columns if the file does not exist yet)
+    if not os.path.exists(path):
+        return {name: np.array([]) for name in COLUMNS}
+    with np.load(path) as results:
+        missing = [name for name in COLUMNS if name not in results]
+        if missing:
+            raise ValueError("{:} has no {:} column, it was written by an older version".format(path, missing[0]))
+        return {name: results[name] for name in COLUMNS}
+
+
+def save_results(path, results):
+    temp_path = path + '.tmp.npz'
+    np.savez(temp_path, **results)
+    os.replace(temp_path, path)
+
+
+def run_sweep(path, solvers=('bfs', 'bidirectional', 'a_star'), probabilities=np.linspace(0.1, 0.9, 17), M=100,
+              N=100, trials=100, processes=None, base_seed=0, track_memory=True, save_every=200):
+    """
+    Runs the phase transition sweep: every solver on `trials` seeded random MxN grid problems for every probability of
+    occupancy. Trials are spread over a process pool and stored in a columnar .npz file (one array per name in
+    COLUMNS). Trials that are already in the file are not run again, so an interrupted sweep can simply be restarted;
+    a file written with another base_seed or track_memory is refused rather than mixed with the new trials.
+
+    :param path: results file (.npz)
+    :param solvers: names of the solvers to run (keys of SOLVERS)
+    :param probabilities: probabilities of occupancy to sweep
+    :param M: grid width
+    :param N: grid height
+    :param trials: number of trials per probability
+    :param processes: number of worker processes (None uses every CPU)
+    :param base_seed: seed from which the per-trial seeds are derived
+    :param track_memory: also record the peak traced memory of every trial (runs each search twice)
+    :param save_every: number of finished trials between two writes of the results file
+    :return: the columns of the results file
+    """
+    results = load_results(path)
+    for name, value in (('base_seed', base_seed), ('track_memory', track_memory)):
+        stored = set(results[name].tolist())
+        if stored - {value}:
+            raise ValueError("{:} holds trials run with {:} = {:}, not {:}".format(path, name, stored.pop(), value))
+    done = set(zip(results['solver'].tolist(), np.round(results['p_occ'], 6).tolist(), results['M'].tolist(),
+                   results['N'].tolist(), results['trial'].tolist(), results['seed'].tolist()))
+    jobs = []
+    for p_occ in probabilities:
+        for trial in range(trials):
+            seed = trial_seed(base_seed, p_occ, M, N, trial)
+            for solver in solvers:
+                if (solver, round(float(p_occ), 6), M, N, trial, seed) not in done:
+                    jobs.append((solver, float(p_occ), M, N, trial, base_seed, seed, track_memory))
+
+    finished = []
+    with Pool(processes) as pool:
+        for count, row in enumerate(pool.imap_unordered(run_trial, jobs), 1):
+            finished.append(row)
+            if count % save_every == 0 or count == len(jobs):
+                for name in COLUMNS:
+                    column = np.array([row[name] for row in finished])
+                    results[name] = np.concatenate((results[name], column)) if len(results[name]) else column
+                finished = []
+                save_results(path, results)
+    return results
+
+
+def summarize(results, solver):
+    """
+    Averages the trials of one solver for every probability of occupancy.
+
+    :return: dictionary of numpy arrays: p_occ, solve_rate, nodes_expanded, max_frontier_size, wall_time, peak_memory
+    """
+    rows = results['solver'] == solver
+    probabilities = np.unique(results['p_occ'][rows])
+    summary = {'p_occ': probabilities}
+    for name, column in (('solve_rate', 'solved'), ('nodes_expanded', 'nodes_expanded'),
+                         ('max_frontier_size', 'max_frontier_size'), ('wall_time', 'wall_time'),
+                         ('peak_memory', 'peak_memory')):
+        summary[name] = np.array([results[column][rows & (results['p_occ'] == p)].astype(float).mean()
+                                  for p in probabilities])
+    return summary
+
+
+def transition_window(results, solver='a_star', high=0.95, low=0.05):
+    """
+    Recomputes the 'phase transition' of search_phase_transition from a results file.
+
+    :param results: columns returned by run_sweep or load_results
+    :param solver: solver whose trials are used
+    :param high: the transition starts at the first probability whose solve rate falls below this value
+    :param low: the transition ends at the first probability whose solve rate is at most this value
+    :return: tuple containing (transition_start_probability, transition_end_probability, peak_probability)
+    """
+    summary = summarize(results, solver)
+    probabilities = summary['p_occ']
+    below_high = np.flatnonzero(summary['solve_rate'] < high)
+    at_low = np.flatnonzero(summary['solve_rate'] <= low)
+    start = probabilities[below_high[0]] if len(below_high) else probabilities[-1]
+    end = probabilities[at_low[0]] if len(at_low) else probabilities[-1]
+    peak = probabilities[np.argmax(summary['nodes_expanded'])]
+    return float(start), float(end), float(peak)
+
+
+def plot_sweep(results, solvers=('bfs', 'bidirectional', 'a_star')):
+    for name, label in (('solve_rate', 'Proportion of Searches Solved'), ('nodes_expanded', 'Nodes Expanded'),
+                        ('wall_time', 'Wall Time (s)'), ('peak_memory', 'Peak Memory (bytes)')):
+        plt.figure()
+        for solver in solvers:
+            summary = summarize(results, solver)
+            plt.plot(summary['p_occ'], summary[name], label=solver)
+        plt.title(label + " versus P_occ")
+        plt.xlabel("P_occ")
+        plt.ylabel(label)
+        plt.legend()
+    plt.show()
+
+
+class DictNode:
+    # Node as it was before __slots__ (one __dict__ per instance), kept for node_memory
+
+    def __init__(self, parent, state, action, path_cost):
+        self.parent = parent
+        self.state = state
+        self.action = action
+        self.path_cost = path_cost
+
+
+def node_memory(num_nodes=100000):
+    """
+    Measures the memory used per search tree node by the three representations used across the solvers: the old
+    __dict__ based Node, the __slots__ Node, and an entry of a flat parent array indexed by state. The nodes form a
+    chain with a (state, child) action tuple each, like the ones breadth_first_search creates.
+
+    :param num_nodes: number of nodes to allocate for each representation
+    :return: dictionary mapping 'dict_node', 'slots_node' and 'parent_array' to bytes per node
+    """
+    bytes_per_node = {}
+    for name, node_class in (('dict_node', DictNode), ('slots_node', Node)):
+        tracemalloc.start()
+        node = node_class(None, 0, None, 0)
+        for state in range(1, num_nodes):
+            node = node_class(node, state, (state - 1, state), node.path_cost + 1)
+        bytes_per_node[name] = tracemalloc.get_traced_memory()[0] / num_nodes
+        tracemalloc.stop()
+        del node
+    tracemalloc.start()
+    parent = array('l', [-1]) * num_nodes
+    bytes_per_node['parent_array'] = tracemalloc.get_traced_memory()[0] / num_nodes
+    tracemalloc.stop()
+    return bytes_per_node
+
+
+if __name__ == '__main__':
+    print("Bytes per search tree node: " + str(node_memory()))
+    results = run_sweep('./phase_transition.npz', M=100, N=100, trials=20)
+    for solver in SOLVERS:
+        summary = summarize(results, solver)
+        print(solver)
+        print("p_occ   solved   expanded   frontier   time (s)   peak memory (kB)")
+        for idx in range(len(summary['p_occ'])):
+            print("{:5.3f}   {:6.2f}   {:8.0f}   {:8.0f}   {:8.4f}   {:16.1f}".format(
+                summary['p_occ'][idx], summary['solve_rate'][idx], summary['nodes_expanded'][idx],
+                summary['max_frontier_size'][idx], summary['wall_time'][idx], summary['peak_memory'][idx] / 1e3))
+    print("Transition window (start, end, peak): " + str(transition_window(results)))
+    plot_sweep(results)
@@ -1,80 +1,204 @@
+import time
 from collections import deque
 import numpy as np
-from search_problems import Node, GraphSearchProblem
+from search_problems import Node, GraphSearchProblem, gather_neighbours, node_path, parent_path
+from graph_loader import load_graph_problem
+from instrumentation import NULL_STATS
 
 # function that implements the same functionality as breadth first search
-def actions(problem, node, explored, seen, frontier, seen_other, start, end):
+def actions(problem, node, explored, seen, frontier, seen_other, counts=None):
     explored.add(node.state)
     del seen[node.state]
     actions = problem.get_actions(node.state) # obtains the actions associated with the node
     for action in actions:
         child = problem.get_child_node(node,action)
+        if counts is not None:
+            counts[0] += 1 # children generated
         if child.state not in explored and child.state not in seen: # if the child node has not been explored and is not in seen
             if child.state in seen_other: # if the child node is in the other frontier (i.e. child node from source frontier is in the destination frontier)
-                start_path = path_constructor(child,start) # find the path to get from the start to the common node
-                end_path = path_constructor(seen_other[child.state],end) # find the path to get from the destination to the common node
+                start_path = node_path(child) # find the path to get from the root of this side to the common node
+                end_path = node_path(seen_other[child.state]) # find the path to get from the root of the other side to the common node
                 return start_path + end_path[::-1][1:] # concatenates the two paths and flips the end_path since it is backwards
             frontier.append(child)
             seen[child.state] = child
+            if counts is not None:
+                counts[1] += 1 # children pushed on the frontier
     return None
 
-# same path_constructor function in breadth_first_search
-def path_constructor(node, start):
-    path = []
-    path.insert(0,node.state)
-    parent = node.parent
-    while(True):
-        path.insert(0,parent.state)
-        if parent.state == start:
-            break
-        parent = parent.parent
-    return path
-
-def bidirectional_search(problem):
+def bidirectional_search(problem, stats=NULL_STATS):
     """
         Implement a bidirectional search algorithm that takes instances of SimpleSearchProblem (or its derived
-        classes) and provides a valid and optimal path from the initial state to the goal state.
+        classes) and provides a valid and optimal path from the initial state to the goal state. The destination side
+        is seeded with all of the goal states, so one search finds the path to the nearest goal.
 
         :param problem: instance of SimpleSearchProblem
-        :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+        :param stats: SearchStats to report counters, phase times and frontier sizes into (see instrumentation)
+        :return: path: a list of states (ints) describing the path from problem.init_state to the nearest goal state
                  num_nodes_expanded: number of nodes expanded by your search
                  max_frontier_size: maximum frontier size during search
         """
-    
+    stats.begin('bidirectional_search')
+    problem = stats.wrap(problem) # times get_actions and get_child_node when stats is enabled
+    counts = [0, 0] if stats.enabled else None # children generated and pushed
+
     # obtains the source and destination states
     source_state = problem.init_state
-    dest_state = problem.goal_states[0]
+    dest_states = problem.goal_set
 
     # instantiates all of the variables and data structures needed for the search
     node_source = Node(None,source_state,None,0)
-    node_dest = Node(None,dest_state,None,0)
-    if source_state == dest_state:
-        return [], 0, 0 # if the source state is equal to the destination then the problem is done
+    if source_state in dest_states:
+        stats.end()
+        return [source_state], 0, 0 # if the source state is a destination then the path is that one state
     frontier_source = deque([node_source]) # frontiers for both tne source and destination nodes
-    frontier_dest = deque([node_dest])
+    frontier_dest = deque([Node(None,dest_state,None,0) for dest_state in dest_states])
     seen_source, seen_dest = dict(), dict() # seen dictionarieis for both source and frontier
     seen_source[node_source.state] = node_source
-    seen_dest[node_dest.state] = node_dest
+    for node_dest in frontier_dest:
+        seen_dest[node_dest.state] = node_dest
+    num_roots = 1 + len(frontier_dest)
     explored_source, explored_dest = set(), set() # explored sets for both source and frontier
     max_frontier_size = 0
     num_nodes_expanded = 0
     
     while len(frontier_source) != 0 and len(frontier_dest) != 0: # continues to loop while both frontiers are not empty
         max_frontier_size = max(len(frontier_source), len(frontier_dest), max_frontier_size)
+        if counts is not None:
+            stats.sample_frontier(num_nodes_expanded, len(frontier_source) + len(frontier_dest))
         for i in range(0,len(frontier_source)): # pops all of the nodes in the source frontier at the beginning of the cycle
             node = deque.popleft(frontier_source)
             num_nodes_expanded = num_nodes_expanded + 1
-            path = actions(problem,node,explored_source,seen_source,frontier_source,seen_dest,source_state,dest_state) # calls the action function to update variables and data structures
+            path = actions(problem,node,explored_source,seen_source,frontier_source,seen_dest,counts) # calls the action function to update variables and data structures
             if path != None:
+                report(stats, num_nodes_expanded, counts, num_roots)
                 return path, num_nodes_expanded, max_frontier_size # if a path is found, return the path
         for i in range(0,len(frontier_dest)): # pops all of the nodes in the destination frontier at the beginning of the cycle
             node = deque.popleft(frontier_dest)
             num_nodes_expanded = num_nodes_expanded + 1
-            path = actions(problem,node,explored_dest,seen_dest,frontier_dest,seen_source,dest_state,source_state) # calls the action function to update variables and data structures
+            path = actions(problem,node,explored_dest,seen_dest,frontier_dest,seen_source,counts) # calls the action function to update variables and data structures
             if path != None:
+                report(stats, num_nodes_expanded, counts, num_roots)
                 return path[::-1], num_nodes_expanded, max_frontier_size # if a path is found, return a path --> backwards in this case since it is found in the destination frontier
+    report(stats, num_nodes_expanded, counts, num_roots)
     return [], num_nodes_expanded, max_frontier_size
 
+def report(stats, num_nodes_expanded, counts, num_roots):
+    # Closes a bidirectional_search run in stats (counts is None when stats is disabled)
+    if counts is None:
+        stats.end()
+        return
+    generated, pushes = counts
+    stats.end(expanded=num_nodes_expanded, generated=generated, pushes=pushes + num_roots, pops=num_nodes_expanded,
+              duplicates=generated - pushes) # the roots are pushed without being generated
+
+
+def direction_optimizing_bidirectional_search(problem, alpha=4, beta=24, level_stats=None):
+    """
+    Level-synchronous bidirectional search over the CSR adjacency of a GraphSearchProblem. At every step the side whose
+    frontier has fewer outgoing edges is expanded by one full level. A side switches from top-down expansion (scan the
+    frontier's edges) to bottom-up expansion (scan the unvisited vertices for a parent in the frontier) once its
+    frontier has more than 1/alpha of the edges left in unvisited vertices, and switches back once the frontier holds
+    fewer than 1/beta of the vertices.
+
+    The search stops at the first level that reaches a vertex already visited by the other side. Both sides only ever
+    hold complete levels, so every meeting vertex found in that level lies on a shortest path and the path is optimal.
+    The goal side starts from all of the goal states at once, so the path leads to the nearest goal.
+
+    :param problem: instance of GraphSearchProblem
+    :param alpha: top-down to bottom-up switching threshold (edge ratio)
+    :param beta: bottom-up to top-down switching threshold (vertex ratio)
+    :param level_stats: optional list; one dictionary per expanded level is appended to it with the side, direction,
+                        depth, frontier size, nodes expanded, edges examined and wall time of that level
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest goal state
+             num_nodes_expanded: number of nodes expanded (frontier vertices top-down, scanned vertices bottom-up)
+             max_frontier_size: maximum frontier size during search
+    """
+    source_state = problem.init_state
+    if problem.goal_test(source_state):
+        return [source_state], 0, 0
+    source = problem.vertex_index(source_state)
+    dests = np.array([problem.vertex_index(dest_state) for dest_state in problem.goal_set], dtype=problem.indices.dtype)
+    dests = np.unique(dests[dests >= 0])
+    if source < 0 or len(dests) == 0:
+        return [], 0, 0
+
+    offsets, indices = problem.offsets, problem.indices
+    num_vertices = len(offsets) - 1
+    degree = np.diff(offsets)
+    sides = []
+    for name, roots in (('source', np.array([source], dtype=indices.dtype)), ('goal', dests)):
+        side = {'name': name, 'top_down': True, 'depth': 0,
+                'parent': np.full(num_vertices, -1, dtype=indices.dtype),
+                'frontier': roots,
+                'unvisited_edges': int(offsets[-1] - degree[roots].sum())}
+        side['parent'][roots] = roots
+        sides.append(side)
+    max_frontier_size = len(dests)
+    num_nodes_expanded = 0
+
+    while len(sides[0]['frontier']) != 0 and len(sides[1]['frontier']) != 0:
+        # expand the side with the fewest frontier edges
+        frontier_edges = [int(degree[side['frontier']].sum()) for side in sides]
+        current = 0 if frontier_edges[0] <= frontier_edges[1] else 1
+        side, other = sides[current], sides[1 - current]
+        frontier, parent = side['frontier'], side['parent']
+        if side['top_down'] and frontier_edges[current] > side['unvisited_edges'] / alpha:
+            side['top_down'] = False
+        elif not side['top_down'] and len(frontier) < num_vertices / beta:
+            side['top_down'] = True
+
+        start = time.perf_counter()
+        if side['top_down']:
+            positions, children = gather_neighbours(offsets, indices, frontier)
+            edges_examined = len(children)
+            new = parent[children] < 0
+            children, positions = children[new], positions[new]
+            children, first = np.unique(children, return_index=True)
+            order = np.argsort(first) # keep the children in the order they were generated
+            children, positions = children[order], positions[first[order]]
+            parents = frontier[positions]
+            scanned = len(frontier)
+        else:
+            in_frontier = np.zeros(num_vertices, dtype=bool)
+            in_frontier[frontier] = True
+            unvisited = np.flatnonzero(parent < 0)
+            positions, neighbours = gather_neighbours(offsets, indices, unvisited)
+            hits = np.flatnonzero(in_frontier[neighbours]) # edges leading from an unvisited vertex into the frontier
+            rows, first = np.unique(positions[hits], return_index=True)
+            # a vertex stops scanning its row at the first edge into the frontier
+            row_starts = np.cumsum(degree[unvisited]) - degree[unvisited]
+            edges_examined = len(neighbours) - int(degree[unvisited[rows]].sum()) + \
+                int((hits[first] - row_starts[rows] + 1).sum())
+            children = unvisited[rows].astype(indices.dtype)
+            parents = neighbours[hits[first]]
+            positions = rows # bottom-up "expands" the scanned unvisited vertices
+            scanned = len(unvisited)
+        parent[children] = parents
+        meeting = np.flatnonzero(other['parent'][children] >= 0) # vertices now reached from both sides
+        # stop counting at the node that found the first meeting vertex, as bidirectional_search does
+        expanded = int(positions[meeting[0]]) + 1 if len(meeting) != 0 else scanned
+        side['frontier'] = children
+        side['depth'] += 1
+        side['unvisited_edges'] -= int(degree[children].sum())
+        num_nodes_expanded += expanded
+        max_frontier_size = max(max_frontier_size, len(children))
+        if level_stats is not None:
+            level_stats.append({'side': side['name'], 'direction': 'top-down' if side['top_down'] else 'bottom-up',
+                                'depth': side['depth'], 'frontier_size': len(frontier), 'nodes_expanded': expanded,
+                                'edges_examined': edges_examined, 'time': time.perf_counter() - start})
+
+        if len(meeting) != 0:
+            # every vertex of a fully expanded level has the same depth on this side, and the other side had already
+            # finished all its levels, so any meeting vertex of this level closes a shortest path
+            vertex = children[meeting[0]]
+            first_half = parent_path(parent, vertex)
+            second_half = parent_path(other['parent'], vertex)
+            path = first_half + second_half[::-1][1:]
+            if current == 1:
+                path = path[::-1] # the path was built from the goal side
+            return problem.vertex_ids[path].tolist(), num_nodes_expanded, max_frontier_size
+
+    return [], num_nodes_expanded, max_frontier_size
 
 if __name__ == '__main__':
     # Simple example
@@ -103,16 +227,28 @@ if __name__ == '__main__':
     print("Max Frontier Size: " + str(max_frontier_size) + "\n")
 
     # Use stanford_large_network_facebook_combined.txt to make your own test instances
-    E = np.loadtxt('./stanford_large_network_facebook_combined.txt', dtype=int)
-    V = np.unique(E)
+    # (parsed once, then loaded from the binary cache written next to the edge list)
     goal_states = [349]
     init_state = 0
-    problem = GraphSearchProblem(goal_states, init_state, V, E)
+    problem = load_graph_problem('./stanford_large_network_facebook_combined.txt', goal_states, init_state)
     path, num_nodes_expanded, max_frontier_size = bidirectional_search(problem)
     correct = problem.check_graph_solution(path)
     print("Solution is correct: {:}".format(correct))
     print("Final Path: " + str(path))
     print("Number of Nodes Expanded: " + str(num_nodes_expanded))
+    print("Max Frontier Size: " + str(max_frontier_size) + "\n")
+
+    # Direction-optimizing version on the same instance, with a per-level report
+    level_stats = []
+    path, num_nodes_expanded, max_frontier_size = direction_optimizing_bidirectional_search(problem,
+                                                                                             level_stats=level_stats)
+    correct = problem.check_graph_solution(path)
+    print("Direction-optimizing solution is correct: {:}".format(correct))
+    print("Final Path: " + str(path))
+    print("Number of Nodes Expanded: " + str(num_nodes_expanded))
     print("Max Frontier Size: " + str(max_frontier_size))
+    for level in level_stats:
+        print("{side:>6} depth {depth}: {direction:>9}, frontier {frontier_size}, expanded {nodes_expanded}, "
+              "edges {edges_examined}, {time:.6f} s".format(**level))
 
     # Be sure to compare with breadth_first_search!
\ No newline at end of file
@@ -1,35 +1,54 @@
+import time
 from collections import deque
 import numpy as np
-from search_problems import Node, GraphSearchProblem
+from search_problems import Node, GraphSearchProblem, gather_neighbours, node_path, parent_path
+from graph_loader import load_graph_problem
+from instrumentation import NULL_STATS
 
-def breadth_first_search(problem):
+def breadth_first_search(problem, stats=NULL_STATS, reverse=False):
     """
     Implement a simple breadth-first search algorithm that takes instances of SimpleSearchProblem (or its derived
     classes) and provides a valid and optimal path from the initial state to the goal state. Useful for testing your
     bidirectional and A* search algorithms.
 
+    Any of the goal states ends the search, so one search finds the nearest goal. With reverse=True the search is
+    seeded from all of the goal states at once and runs until it reaches the initial state (the actions are
+    undirected, so the reversed path is a shortest path to the nearest goal).
+
     :param problem: instance of SimpleSearchProblem
-    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+    :param stats: SearchStats to report counters, phase times and frontier sizes into (see instrumentation)
+    :param reverse: multi-source search from the goal states to the initial state
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest goal state
              num_nodes_expanded: number of nodes expanded by your search
              max_frontier_size: maximum frontier size during search
     """
-    
+    stats.begin('breadth_first_search')
+    problem = stats.wrap(problem) # times get_actions and get_child_node when stats is enabled
+    instrumented = stats.enabled
+
     # gets the goal and initial state
-    goal_states = problem.goal_states[0]
     state = problem.init_state
+    if problem.goal_test(state):
+        stats.end()
+        return [state], 0, 0 # checks to see if the initial state is the goal state (a path of one state)
+    if reverse:
+        roots, goal_states = list(problem.goal_set), frozenset([state]) # the goals are the roots of the search tree
+    else:
+        roots, goal_states = [state], problem.goal_set
 
     # initializes the variables and data structures needed for the search
-    node = Node(None,state,None,0)
-    if goal_states == node.state:
-        return [], 0, 0 # checks to see if the initial state is the goal state
-    frontier = deque([node])
-    seen = set([node.state])
+    frontier = deque([Node(None,root,None,0) for root in roots])
+    seen = set(roots)
     explored = set()
     max_frontier_size = 0
     num_nodes_expanded = 0
+    num_nodes_generated = 0
+    num_pushes = len(roots)
     
     while len(frontier) != 0: # continues to loop while the frontier is empty
         max_frontier_size = max(max_frontier_size, len(frontier))
+        if instrumented:
+            stats.sample_frontier(num_nodes_expanded, len(frontier))
         node = deque.popleft(frontier) # pops the node in the queue
         num_nodes_expanded = num_nodes_expanded + 1
         explored.add(node.state)
@@ -37,25 +56,118 @@ def breadth_first_search(problem):
         actions = problem.get_actions(node.state) # obtains the actions associated with the node
         for action in actions: # iterates through the actions
             child = problem.get_child_node(node,action)
+            num_nodes_generated += 1
             if child.state not in explored and child.state not in seen: # checks to see if the child node has not been explored or seen before
-                if child.state == goal_states:
-                    return path_constructor(child,state), num_nodes_expanded, max_frontier_size # returns the path if the child is the goal state
+                if child.state in goal_states:
+                    stats.end(expanded=num_nodes_expanded, generated=num_nodes_generated, pushes=num_pushes,
+                              pops=num_nodes_expanded, duplicates=num_nodes_generated - num_pushes + len(roots) - 1)
+                    path = node_path(child) # from the root the child descends from
+                    return path[::-1] if reverse else path, num_nodes_expanded, max_frontier_size # returns the path if the child is the goal state
                 frontier.append(child)
+                num_pushes += 1
                 seen.add(child.state) # adds the child's attributed to the frontier and seen set
 
+    stats.end(expanded=num_nodes_expanded, generated=num_nodes_generated, pushes=num_pushes, pops=num_nodes_expanded,
+              duplicates=num_nodes_generated - num_pushes + len(roots))
     return [], num_nodes_expanded, max_frontier_size # if the loop is broken without a path --> no solution to the problem
 
-# function that deterines the final path once the goal state is found
-def path_constructor(node, start):
-    path = []
-    path.insert(0,node.state) # inserts the goal state at the front of the list
-    parent = node.parent
-    while(True):
-        path.insert(0,parent.state) # continually adds the parent node of the current node to the front of the list
-        if parent.state == start: # breaks out of the loop once the initial state is reached
-            break
-        parent = parent.parent
-    return path
+def csr_breadth_first_search(problem):
+    """
+    Level-synchronous breadth-first search over the CSR adjacency of a GraphSearchProblem. The frontier is kept as a
+    numpy array of dense vertex indices and a whole level is expanded at once, so no Node objects or action tuples are
+    created and memory stays linear in the number of vertices. With several goal states the search is seeded from all
+    of them at once and stops when it reaches the initial state, which finds the nearest goal in one search.
+
+    :param problem: instance of GraphSearchProblem
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest goal state
+             num_nodes_expanded: number of nodes expanded by the search (counted as in breadth_first_search)
+             max_frontier_size: maximum frontier (level) size during search
+    """
+    if problem.goal_test(problem.init_state):
+        return [problem.init_state], 0, 0 # same convention as breadth_first_search
+    source = problem.vertex_index(problem.init_state)
+    goals = np.array([problem.vertex_index(goal) for goal in problem.goal_set], dtype=problem.indices.dtype)
+    goals = goals[goals >= 0] # goal states that are not in the graph can never be reached
+    if source < 0 or len(goals) == 0:
+        return [], 0, 0 # one of the states is not in the graph --> no solution to the problem
+    if len(goals) == 1:
+        goal = goals[0]
+        parent, num_nodes_expanded, max_frontier_size = csr_bfs(problem.offsets, problem.indices, source, goals)
+        if parent[goal] < 0:
+            return [], num_nodes_expanded, max_frontier_size
+        return problem.vertex_ids[parent_path(parent, goal)].tolist(), num_nodes_expanded, max_frontier_size
+    parent, num_nodes_expanded, max_frontier_size = csr_bfs(problem.offsets, problem.indices, goals,
+                                                            np.array([source]))
+    if parent[source] < 0:
+        return [], num_nodes_expanded, max_frontier_size
+    return problem.vertex_ids[parent_path(parent, source)[::-1]].tolist(), num_nodes_expanded, max_frontier_size
+
+
+def csr_bfs(offsets, indices, source, targets=None):
+    """
+    Level-synchronous breadth-first search kernel over a CSR adjacency (see search_problems.build_csr).
+
+    :param offsets: CSR row offsets
+    :param indices: CSR neighbour indices
+    :param source: dense index of the vertex to search from (or numpy array of indices, searched from all at once)
+    :param targets: optional numpy array of dense indices; the search stops as soon as all of them are reached
+                    (None searches the whole connected component of source)
+    :return: parent: numpy array with the BFS parent of each reached vertex (parent[source] == source, -1 if unreached)
+             num_nodes_expanded: number of vertices expanded before the last target was generated
+             max_frontier_size: largest level expanded during the search
+    """
+    parent = np.full(len(offsets) - 1, -1, dtype=indices.dtype)
+    parent[source] = source
+    frontier = np.unique(np.asarray(source, dtype=indices.dtype))
+    remaining = 0
+    if targets is not None:
+        targets = np.unique(targets)
+        remaining = np.count_nonzero(parent[targets] < 0)
+        if remaining == 0:
+            return parent, 0, 0
+    max_frontier_size = 0
+    num_nodes_expanded = 0
+
+    while len(frontier) != 0: # every pass of the loop expands one full level
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        positions, children = gather_neighbours(offsets, indices, frontier)
+        new = parent[children] < 0 # only keep children that were never reached before
+        children, positions = children[new], positions[new]
+        children, first = np.unique(children, return_index=True) # first frontier node to reach a child is its parent
+        order = np.argsort(first) # keep the children in the order they were generated
+        children, positions = children[order], positions[first[order]]
+        parent[children] = frontier[positions]
+        if remaining:
+            found = np.isin(children, targets, assume_unique=True)
+            remaining -= np.count_nonzero(found)
+            if remaining == 0: # only count the nodes expanded up to the one that generated the last target
+                return parent, num_nodes_expanded + int(positions[found].max()) + 1, max_frontier_size
+        num_nodes_expanded += len(frontier)
+        frontier = children
+
+    return parent, num_nodes_expanded, max_frontier_size
+
+
+def csr_bfs_distances(offsets, indices, source):
+    """
+    Hop distances from source to every vertex, with the same level-synchronous kernel as csr_bfs.
+
+    :param offsets: CSR row offsets
+    :param indices: CSR neighbour indices
+    :param source: dense index of the vertex to search from (or numpy array of indices: distances to the nearest one)
+    :return: numpy int32 array of distances (-1 for vertices that cannot be reached)
+    """
+    distance = np.full(len(offsets) - 1, -1, dtype=np.int32)
+    distance[source] = 0
+    frontier = np.unique(np.asarray(source, dtype=indices.dtype))
+    depth = 0
+    while len(frontier) != 0:
+        depth += 1
+        positions, children = gather_neighbours(offsets, indices, frontier)
+        children = np.unique(children[distance[children] < 0])
+        distance[children] = depth
+        frontier = children
+    return distance
 
 
 if __name__ == '__main__':
@@ -85,14 +197,43 @@ if __name__ == '__main__':
     print("Max Frontier Size: " + str(max_frontier_size) + "\n")
 
     # Use stanford_large_network_facebook_combined.txt to make your own test instances
-    E = np.loadtxt('./stanford_large_network_facebook_combined.txt', dtype=int)
-    V = np.unique(E)
+    # (parsed once, then loaded from the binary cache written next to the edge list)
     goal_states = [349]
     init_state = 0
-    problem = GraphSearchProblem(goal_states, init_state, V, E)
+    problem = load_graph_problem('./stanford_large_network_facebook_combined.txt', goal_states, init_state)
     path, num_nodes_expanded, max_frontier_size = breadth_first_search(problem)
     correct = problem.check_graph_solution(path)
     print("Solution is correct: {:}".format(correct))
     print("Final Path: " + str(path))
     print("Number of Nodes Expanded: " + str(num_nodes_expanded))
-    print("Max Frontier Size: " + str(max_frontier_size))
\ No newline at end of file
+    print("Max Frontier Size: " + str(max_frontier_size) + "\n")
+
+    # Compare with the level-synchronous CSR search on the same instance
+    start = time.time()
+    breadth_first_search(problem)
+    node_time = time.time() - start
+    start = time.time()
+    path, num_nodes_expanded, max_frontier_size = csr_breadth_first_search(problem)
+    csr_time = time.time() - start
+    correct = problem.check_graph_solution(path)
+    print("CSR Solution is correct: {:}".format(correct))
+    print("CSR Final Path: " + str(path))
+    print("CSR Number of Nodes Expanded: " + str(num_nodes_expanded))
+    print("CSR Max Frontier Size: " + str(max_frontier_size))
+    print("Speedup over breadth_first_search: {:.1f}x".format(node_time / csr_time))
+
+    # Same comparison over 30 random queries (fixed seed), where the goal is usually farther than 349 is from 0
+    np.random.seed(0)
+    node_time = 0
+    csr_time = 0
+    for init_state, goal_state in np.random.choice(problem.V, size=(30, 2)).tolist():
+        problem.init_state, problem.goal_states = init_state, [goal_state]
+        start = time.time()
+        node_solution = breadth_first_search(problem)[0]
+        node_time += time.time() - start
+        start = time.time()
+        csr_solution = csr_breadth_first_search(problem)[0]
+        csr_time += time.time() - start
+        assert len(node_solution) == len(csr_solution)
+    print("30 random queries: breadth_first_search {:.2f} s, CSR {:.2f} s, speedup {:.1f}x".format(
+        node_time, csr_time, node_time / csr_time))
\ No newline at end of file
@@ -0,0 +1,276 @@
+import json
+import os
+from multiprocessing import Pool
+import numpy as np
+from search_problems import GraphSearchProblem, gather_neighbours, parent_path
+from landmark_search import LandmarkTable
+
+UNREACHED = 255 # hop distance stored for pairs of vertices that are not connected
+
+
+class DistanceOracle:
+    """
+    Precomputed shortest paths for an unweighted, undirected graph, so that (init_state, goal) queries are answered
+    with table lookups instead of a search.
+
+    In the exact mode, distances is the full (num_vertices, num_vertices) uint8 matrix of hop distances (UNREACHED for
+    pairs that are not connected), and next_hop, when it was built, holds for every pair (v, t) the dense index of the
+    first vertex after v on a shortest path to t (-1 when there is none). A path is then followed one lookup per step;
+    without next_hop every step picks a neighbour one hop closer to the goal in the distance matrix.
+
+    Graphs too large for an all-pairs matrix use the landmark mode instead: a few landmarks and their breadth-first
+    search trees, with every query routed through the landmark giving the shortest detour. Those paths are valid but
+    only approximately shortest, and distance returns their length (an upper bound on the true distance).
+
+    The matrices are written straight to .npy files in a directory and memory-mapped back by load.
+    """
+    def __init__(self, vertex_ids, offsets, indices, distances=None, next_hop=None, landmarks=None, trees=None):
+        self.vertex_ids = vertex_ids
+        self.offsets = offsets
+        self.indices = indices
+        self.distances = distances # exact mode: all-pairs uint8 hop distances
+        self.next_hop = next_hop # exact mode (optional): first step of a shortest path for every pair
+        self.landmarks = landmarks # landmark mode: dense indices of the landmarks
+        self.trees = trees # landmark mode: (number of landmarks, num_vertices) BFS parent arrays of the landmarks
+        self.exact = distances is not None
+
+    @classmethod
+    def build(cls, vertex_ids, offsets, indices, directory, next_hop=False, processes=None, chunk_size=64,
+              max_vertices=20000, k=16):
+        """
+        Runs a breadth-first search from every vertex, a chunk of sources at a time, and writes the results to
+        memory-mapped files in directory.
+
+        :param vertex_ids: sorted unique vertex identifiers (see search_problems.build_csr)
+        :param offsets: CSR row offsets
+        :param indices: CSR neighbour indices
+        :param directory: directory for the matrices (created if needed)
+        :param next_hop: also build the next-hop matrix for path extraction
+        :param processes: number of worker processes (None or 1 builds in this process)
+        :param chunk_size: number of sources searched by a worker per task
+        :param max_vertices: graphs with more vertices get the landmark approximation instead of the all-pairs matrix
+        :param k: number of landmarks in the landmark mode
+        :return: DistanceOracle (memory-mapped from directory)
+        """
+        num_vertices = len(offsets) - 1
+        os.makedirs(directory, exist_ok=True)
+        if num_vertices > max_vertices:
+            table = LandmarkTable.build(offsets, indices, k)
+            landmarks = table.landmarks
+            trees = np.lib.format.open_memmap(os.path.join(directory, 'trees.npy'), mode='w+',
+                                              dtype=indices.dtype, shape=(len(landmarks), num_vertices))
+            sources = np.repeat(np.arange(num_vertices, dtype=indices.dtype), np.diff(offsets)) # CSR row of every edge
+            for row, landmark in enumerate(landmarks): # the selection already searched from every landmark
+                trees[row] = distance_tree(indices, sources, int(landmark), table.distances[:, row], table.unreached)
+            trees.flush()
+            np.save(os.path.join(directory, 'landmarks.npy'), landmarks)
+            del trees
+            write_meta(directory, {'exact': False, 'next_hop': False})
+            return cls.load(directory, vertex_ids, offsets, indices)
+
+        distances_path = os.path.join(directory, 'distances.npy')
+        next_hop_path = os.path.join(directory, 'next_hop.npy') if next_hop else None
+        np.lib.format.open_memmap(distances_path, mode='w+', dtype=np.uint8, shape=(num_vertices, num_vertices))
+        if next_hop:
+            np.lib.format.open_memmap(next_hop_path, mode='w+', dtype=hop_dtype(num_vertices),
+                                      shape=(num_vertices, num_vertices))
+        chunks = [(start, min(start + chunk_size, num_vertices)) for start in range(0, num_vertices, chunk_size)]
+        graph = (offsets, indices, distances_path, next_hop_path)
+        if processes is None or processes <= 1:
+            attach_oracle_files(*graph)
+            try:
+                for chunk in chunks:
+                    fill_rows(chunk)
+            finally:
+                detach_oracle_files()
+        else:
+            with Pool(processes, initializer=attach_oracle_files, initargs=graph) as pool:
+                pool.map(fill_rows, chunks) # raises as soon as one chunk fails
+        write_meta(directory, {'exact': True, 'next_hop': next_hop})
+        return cls.load(directory, vertex_ids, offsets, indices)
+
+    @classmethod
+    def load(cls, directory, vertex_ids, offsets, indices):
+        # Oracle built in directory for this graph, with its matrices memory-mapped read-only
+        with open(os.path.join(directory, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+        if not meta['exact']:
+            return cls(vertex_ids, offsets, indices, landmarks=np.load(os.path.join(directory, 'landmarks.npy')),
+                       trees=np.load(os.path.join(directory, 'trees.npy'), mmap_mode='r'))
+        next_hop = np.load(os.path.join(directory, 'next_hop.npy'), mmap_mode='r') if meta['next_hop'] else None
+        return cls(vertex_ids, offsets, indices, np.load(os.path.join(directory, 'distances.npy'), mmap_mode='r'),
+                   next_hop)
+
+    def problem(self, init_state, goal):
+        # GraphSearchProblem for one query over the oracle's graph (e.g. to check a path with check_graph_solution)
+        return GraphSearchProblem.from_csr([goal], init_state, self.vertex_ids, self.offsets, self.indices)
+
+    def distance(self, init_state, goal):
+        """
+        :return: number of hops from init_state to goal (-1 if they are not connected or not in the graph); in the
+                 landmark mode, the length of the path returned by path
+        """
+        if not self.exact:
+            return len(self.path(init_state, goal)) - 1
+        source, target = self._dense(init_state), self._dense(goal)
+        if source < 0 or target < 0:
+            return -1
+        hops = int(self.distances[source, target])
+        return -1 if hops == UNREACHED else hops
+
+    def path(self, init_state, goal):
+        """
+        :return: list of states from init_state to goal ([] if there is no path)
+        """
+        source, target = self._dense(init_state), self._dense(goal)
+        if source < 0 or target < 0:
+            return []
+        if not self.exact:
+            path = self._landmark_path(source, target)
+        elif self.distances[source, target] == UNREACHED:
+            return []
+        elif self.next_hop is not None:
+            path = [source]
+            while path[-1] != target:
+                path.append(int(self.next_hop[path[-1], target]))
+        else:
+            to_target = self.distances[target] # the graph is undirected, so the matrix is symmetric
+            path = [source]
+            while path[-1] != target: # step to any neighbour one hop closer to the goal
+                row = self.indices[self.offsets[path[-1]]:self.offsets[path[-1] + 1]]
+                path.append(int(row[np.argmax(to_target[row] == to_target[path[-1]] - 1)]))
+        return self.vertex_ids[path].tolist()
+
+    def _landmark_path(self, source, target):
+        # Shortest of the paths source -> landmark -> target through the BFS tree of each landmark (dense indices)
+        best = []
+        for tree in self.trees:
+            if tree[source] < 0 or tree[target] < 0:
+                continue
+            up = parent_path(tree, source)
+            down = parent_path(tree, target)
+            shared = 0 # both branches start at the landmark: only go up to where they split
+            while shared + 1 < min(len(up), len(down)) and up[shared + 1] == down[shared + 1]:
+                shared += 1
+            path = up[:shared:-1] + down[shared:]
+            if not best or len(path) < len(best):
+                best = path
+        return best
+
+    def _dense(self, state):
+        # Dense index of a state, -1 if it is not a vertex of the graph
+        idx = int(np.searchsorted(self.vertex_ids, state))
+        if idx < len(self.vertex_ids) and self.vertex_ids[idx] == state:
+            return idx
+        return -1
+
+
+def hop_dtype(num_vertices):
+    # Smallest signed integer type that holds every dense index and -1
+    return np.int16 if num_vertices <= np.iinfo(np.int16).max else np.int32
+
+
+def write_meta(directory, meta):
+    with open(os.path.join(directory, 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file)
+
+
+# CSR adjacency and output matrices as seen by a worker process (set in attach_oracle_files)
+_oracle_files = None
+
+
+def attach_oracle_files(offsets, indices, distances_path, next_hop_path):
+    global _oracle_files
+    distances = np.load(distances_path, mmap_mode='r+')
+    next_hop = np.load(next_hop_path, mmap_mode='r+') if next_hop_path is not None else None
+    _oracle_files = (offsets, indices, distances, next_hop)
+
+
+def detach_oracle_files():
+    global _oracle_files
+    _oracle_files = None
+
+
+def distance_tree(indices, sources, landmark, distance, unreached):
+    """
+    BFS parent array of a landmark rebuilt from its hop distances, without searching again: every reached vertex points
+    to the neighbour one hop closer to the landmark that comes first in its row (edges are written in reverse so that
+    one wins).
+
+    :param indices: CSR neighbour indices
+    :param sources: CSR row of every entry of indices
+    :param landmark: dense index of the landmark
+    :param distance: hop distance of every vertex from the landmark (unreached for vertices it cannot reach)
+    :param unreached: marker of the vertices the landmark cannot reach
+    :return: numpy array with the parent of each vertex (parent[landmark] == landmark, -1 if unreached)
+    """
+    distance = np.asarray(distance, dtype=np.int64)
+    closer = (distance[sources] != unreached) & (distance[indices] == distance[sources] - 1)
+    parent = np.full(len(distance), -1, dtype=indices.dtype)
+    parent[sources[closer][::-1]] = indices[closer][::-1]
+    parent[landmark] = landmark
+    return parent
+
+
+def fill_rows(chunk):
+    """
+    Breadth-first searches from the sources start, ..., stop - 1, written into their rows of the matrices. Raises
+    ValueError as soon as a search reaches UNREACHED hops, which the uint8 distance matrix cannot hold.
+
+    :param chunk: tuple (start, stop) of dense source indices
+    """
+    offsets, indices, distances, next_hop = _oracle_files
+    num_vertices = len(offsets) - 1
+    for source in range(*chunk):
+        distance = np.full(num_vertices, -1, dtype=np.int64)
+        distance[source] = 0
+        first = np.full(num_vertices, -1, dtype=indices.dtype) if next_hop is not None else None
+        frontier = np.array([source], dtype=indices.dtype)
+        depth = 0
+        while len(frontier) != 0: # level-synchronous, as csr_bfs_distances
+            depth += 1
+            positions, children = gather_neighbours(offsets, indices, frontier)
+            new = distance[children] < 0
+            children, first_position = np.unique(children[new], return_index=True)
+            if depth == UNREACHED and len(children) != 0:
+                raise ValueError("The graph has shortest paths of {:} hops or more, which do not fit in the uint8 "
+                                 "distance matrix".format(UNREACHED))
+            distance[children] = depth
+            if first is not None: # the first step toward a child is the first step toward its parent
+                first[children] = children if depth == 1 else first[frontier[positions[new][first_position]]]
+            frontier = children
+        distances[source] = np.where(distance < 0, UNREACHED, distance)
+        if first is not None:
+            next_hop[source] = first
+    distances.flush()
+    if next_hop is not None:
+        next_hop.flush()
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+    from graph_loader import load_graph
+    from breadth_first_search import csr_breadth_first_search
+
+    vertex_ids, offsets, indices = load_graph('./stanford_large_network_facebook_combined.txt')
+    np.random.seed(0)
+    pairs = [(int(init_state), int(goal)) for init_state, goal in np.random.choice(vertex_ids, (1000, 2))]
+    with tempfile.TemporaryDirectory() as directory:
+        for name, options in (('exact', {'next_hop': True, 'processes': 4}),
+                              ('landmark', {'max_vertices': 0, 'k': 16})):
+            start = time.time()
+            oracle = DistanceOracle.build(vertex_ids, offsets, indices, os.path.join(directory, name), **options)
+            print("{:} oracle built in {:.2f} s".format(name, time.time() - start))
+            start = time.time()
+            paths = [oracle.path(init_state, goal) for init_state, goal in pairs]
+            lookup_time = time.time() - start
+            correct = all(oracle.problem(init_state, goal).check_graph_solution(path)
+                          for (init_state, goal), path in zip(pairs, paths))
+            start = time.time()
+            searched = [csr_breadth_first_search(oracle.problem(init_state, goal))[0] for init_state, goal in pairs]
+            search_time = time.time() - start
+            extra = sum(len(path) - len(shortest) for path, shortest in zip(paths, searched))
+            print("{:} paths are correct: {:}, {:} extra hops over 1000 queries, {:.4f} s against {:.3f} s of "
+                  "search".format(name, correct, extra, lookup_time, search_time))
+            oracle = None # close the memory maps before the directory is removed
@@ -0,0 +1,202 @@
+import numpy as np
+from search_problems import GridSearchProblem, get_random_grid_problem
+from indexed_heap import IndexedMinHeap
+from instrumentation import NULL_STATS
+
+
+class DStarLite:
+    """
+    Incremental planner (D* Lite) for a GridSearchProblem whose cells change between queries. The search runs backwards
+    from the goal: g[s] is the current estimate of the distance from s to the goal and rhs[s] its one-step lookahead
+    (1 + the smallest g of the successors of s). Both are kept between calls, so after update_cells only the states
+    whose distance actually changed are expanded again by the next replan.
+
+    The open list is an IndexedMinHeap keyed by (min(g, rhs) + h(start, s) + km, min(g, rhs)); the second key is stored
+    negated since the heap breaks ties toward the larger g. km grows when the start moves (move_start), which keeps the
+    old keys valid lower bounds without reordering the heap.
+    """
+    def __init__(self, problem):
+        self.problem = problem
+        self.M = problem.M
+        num_states = problem.M * problem.N
+        self.goal_state = problem.goal_states[0]
+        self.start = problem.init_state
+        self.last_start = self.start # start when km was last updated
+        self.km = 0
+        self.g = [float('inf')] * num_states
+        self.rhs = [float('inf')] * num_states
+        self.rhs[self.goal_state] = 0
+        self.timed_heuristic = self.heuristic # heuristic as timed by the stats of the replan in progress
+        self.num_pushes = 1 # open list insertions and key changes so far
+        self.open = IndexedMinHeap(num_states)
+        self.open.push(self.goal_state, self.heuristic(self.goal_state), 0)
+
+    def heuristic(self, state):
+        # Manhattan distance from the current start to state
+        M = self.M
+        return abs(state % M - self.start % M) + abs(state // M - self.start // M)
+
+    def update_vertex(self, state):
+        # Recomputes rhs[state] and puts state in the open list if, and only if, it is locally inconsistent
+        g, rhs, open = self.g, self.rhs, self.open
+        if state != self.goal_state:
+            best = float('inf')
+            for child in self.problem.neighbour_table[state].tolist():
+                if child >= 0 and g[child] + 1 < best:
+                    best = g[child] + 1
+            rhs[state] = best
+        if state in open:
+            open.remove(state)
+        if g[state] != rhs[state]:
+            k2 = min(g[state], rhs[state])
+            open.push(state, k2 + self.timed_heuristic(state) + self.km, -k2)
+            self.num_pushes += 1
+
+    def update_cells(self, changes):
+        """
+        Changes the occupancy of a few cells (through GridSearchProblem.set_cells) and marks the states whose edges
+        changed as inconsistent. The search itself is only repaired by the next call to replan.
+
+        :param changes: iterable of (state, occupied) pairs
+        """
+        changes = list(changes)
+        self.problem.set_cells(changes)
+        affected = set()
+        for state, occupied in changes:
+            affected.add(state)
+            x, y = self.problem.get_position(state)
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if 0 <= nx < self.problem.M and 0 <= ny < self.problem.N:
+                    affected.add(self.problem.get_state(nx, ny))
+        for state in affected:
+            self.update_vertex(state)
+
+    def move_start(self, state):
+        """
+        Moves the start of the problem (e.g. a robot that followed part of the last path). Keys already in the open list
+        stay valid because km is increased by the distance the start moved.
+
+        :param state: new start state
+        """
+        self.start = state
+        self.problem.init_state = state
+        self.km += abs(state % self.M - self.last_start % self.M) + abs(state // self.M - self.last_start // self.M)
+        self.last_start = state
+
+    def compute_shortest_path(self, stats=NULL_STATS):
+        # Expands inconsistent states until the start is consistent and no open key is below the start's key
+        g, rhs, open = self.g, self.rhs, self.open
+        table = self.problem.neighbour_table
+        start = self.start
+        heuristic = self.timed_heuristic
+        instrumented = stats.enabled
+        num_nodes_expanded = 0
+        max_frontier_size = 0
+        num_pops = 0
+        while len(open) != 0:
+            max_frontier_size = max(max_frontier_size, len(open))
+            if instrumented:
+                stats.sample_frontier(num_nodes_expanded, len(open))
+            state = open.peek()
+            k1, k2 = open.f[state], -open.g[state]
+            start_k2 = min(g[start], rhs[start])
+            start_k1 = start_k2 + self.km # h(start, start) is 0
+            if ((k1, k2) >= (start_k1, start_k2)) and rhs[start] == g[start]:
+                break
+            open.pop()
+            num_pops += 1
+            new_k2 = min(g[state], rhs[state])
+            new_k1 = new_k2 + heuristic(state) + self.km
+            if (k1, k2) < (new_k1, new_k2): # key is out of date since the start moved
+                open.push(state, new_k1, -new_k2)
+                self.num_pushes += 1
+                continue
+            num_nodes_expanded += 1
+            if g[state] > rhs[state]: # overconsistent: the state's distance dropped, settle it
+                g[state] = rhs[state]
+                cost = g[state] + 1
+                for parent in table[state].tolist(): # moves are symmetric, successors are also predecessors
+                    if parent >= 0 and parent != self.goal_state and cost < rhs[parent]:
+                        rhs[parent] = cost
+                        if parent in open:
+                            open.remove(parent)
+                        if g[parent] != cost:
+                            open.push(parent, cost + heuristic(parent) + self.km, -cost)
+                            self.num_pushes += 1
+            else: # underconsistent: the state's distance grew, invalidate it and everything that relied on it
+                g[state] = float('inf')
+                self.update_vertex(state)
+                for parent in table[state].tolist():
+                    if parent >= 0:
+                        self.update_vertex(parent)
+        return num_nodes_expanded, max_frontier_size, num_pops
+
+    def replan(self, stats=NULL_STATS):
+        """
+        Repairs the search after the changes made since the last call and extracts the current shortest path.
+
+        :param stats: SearchStats to report counters, phase times and frontier sizes into (see instrumentation); the
+                      pushes made by update_cells since the last replan are counted in this one
+        :return: path: a list of states (ints) from problem.init_state to problem.goal_states[0] ([] if there is none)
+                 num_nodes_expanded: number of states expanded by this replan
+                 max_frontier_size: maximum size of the open list during this replan
+        """
+        stats.begin('d_star_lite')
+        self.timed_heuristic = stats.timed('heuristic', self.heuristic)
+        try:
+            num_nodes_expanded, max_frontier_size, num_pops = self.compute_shortest_path(stats)
+        finally:
+            self.timed_heuristic = self.heuristic
+        stats.end(expanded=num_nodes_expanded, heap_push=self.num_pushes, heap_pop=num_pops)
+        self.num_pushes = 0
+        g = self.g
+        if g[self.start] == float('inf'):
+            return [], num_nodes_expanded, max_frontier_size
+        path = [self.start]
+        table = self.problem.neighbour_table
+        while path[-1] != self.goal_state: # follow the steepest descent of g down to the goal
+            best_child, best = -1, float('inf')
+            for child in table[path[-1]].tolist():
+                if child >= 0 and g[child] < best:
+                    best_child, best = child, g[child]
+            path.append(best_child)
+        return path, num_nodes_expanded, max_frontier_size
+
+
+if __name__ == '__main__':
+    from a_star_search import a_star_search
+
+    # Cells flip a few at a time, mostly on the current path; compare each replan with A* from scratch
+    p_occ = 0.25
+    M = 200
+    N = 200
+    np.random.seed(0)
+    problem = get_random_grid_problem(p_occ, M, N)
+    planner = DStarLite(problem)
+    path, num_nodes_expanded, max_frontier_size = planner.replan()
+    print("Initial plan: {:} nodes expanded, path length {:}".format(num_nodes_expanded, len(path)))
+    replans = 0
+    d_star_total = 0
+    a_star_total = 0
+    print("replan   changed   D* Lite expanded   A* expanded   path length")
+    for replan in range(20):
+        changes = []
+        if len(path) > 2:
+            for state in np.random.choice(path[1:-1], 3): # obstacles discovered on the planned path
+                changes.append((int(state), True))
+        for state in np.random.choice(M * N, 5): # and a few cells elsewhere opening or closing
+            if state not in (problem.init_state, problem.goal_states[0]):
+                changes.append((int(state), bool(np.random.rand() < 0.5)))
+        planner.update_cells(changes)
+        path, num_nodes_expanded, max_frontier_size = planner.replan()
+        a_star_path, a_star_expanded, a_star_frontier = a_star_search(problem)
+        assert len(path) == len(a_star_path) and (not path or problem.check_solution(path))
+        print("{:6}   {:7}   {:16}   {:11}   {:11}".format(replan, len(changes), num_nodes_expanded, a_star_expanded,
+                                                         len(path)))
+        replans += 1
+        d_star_total += num_nodes_expanded
+        a_star_total += a_star_expanded
+        if not path:
+            break
+    print("Average nodes expanded per replan: D* Lite {:.0f}, A* {:.0f}".format(d_star_total / replans,
+                                                                             a_star_total / replans))
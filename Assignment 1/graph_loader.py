@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import numpy as np
+from search_problems import GraphSearchProblem, build_csr
+
+CACHE_VERSION = 1
+CHUNK_BYTES = 1 << 24
+
+
+def load_graph(path, cache_dir=None):
+    """
+    Loads an edge list (SNAP text format: one "u v" or "u v w" edge per line, '#' comment lines) as a CSR adjacency.
+    The text is only parsed the first time: the CSR arrays and the vertex identifier remap are then written as .npy
+    files to a cache directory and later loads memory-map them. The cache is rebuilt when the SHA-256 checksum of the
+    edge list no longer matches the one recorded in the cache (the checksum is only recomputed when the file size or
+    modification time changed).
+
+    :param path: path to the edge list
+    :param cache_dir: directory for the binary cache (defaults to path + '.cache')
+    :return: vertex_ids: sorted unique vertex identifiers (dense index i is vertex vertex_ids[i])
+             offsets: CSR row offsets
+             indices: CSR neighbour indices (dense)
+    """
+    if cache_dir is None:
+        cache_dir = path + '.cache'
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    stat = os.stat(path)
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        if meta.get('version') != CACHE_VERSION:
+            meta = None
+        elif meta['size'] != stat.st_size or meta['mtime_ns'] != stat.st_mtime_ns:
+            # the file was touched or copied; only rebuild if its content actually changed
+            if meta['checksum'] == file_checksum(path):
+                meta['size'], meta['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+                write_meta(meta_path, meta)
+            else:
+                meta = None
+
+    if meta is None:
+        vertex_ids, offsets, indices = parse_edge_list(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(meta_path):
+            os.remove(meta_path) # the cache is invalid until the new meta file is written
+        for name, array in (('vertex_ids', vertex_ids), ('offsets', offsets), ('indices', indices)):
+            np.save(os.path.join(cache_dir, name + '.npy'), array)
+        write_meta(meta_path, {'version': CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                               'checksum': file_checksum(path)})
+
+    return tuple(np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode='r')
+                 for name in ('vertex_ids', 'offsets', 'indices'))
+
+
+def load_graph_problem(path, goal_states, init_state, cache_dir=None):
+    # GraphSearchProblem built straight from the (cached) CSR arrays of an edge list file
+    return GraphSearchProblem.from_csr(goal_states, init_state, *load_graph(path, cache_dir))
+
+
+def parse_edge_list(path):
+    """
+    Streams an edge list file in large blocks and builds its CSR adjacency.
+
+    :param path: path to the edge list
+    :return: vertex_ids, offsets, indices (see load_graph)
+    """
+    blocks = []
+    num_columns = None
+    with open(path, 'rb') as edge_file:
+        remainder = b''
+        while True:
+            chunk = edge_file.read(CHUNK_BYTES)
+            data = remainder + chunk
+            if chunk:
+                cut = data.rfind(b'\n') + 1 # only parse complete lines, keep the rest for the next block
+                data, remainder = data[:cut], data[cut:]
+            if b'#' in data:
+                data = b'\n'.join(line for line in data.split(b'\n') if not line.lstrip().startswith(b'#'))
+            if num_columns is None:
+                lines = [line for line in data.split(b'\n') if line.strip()]
+                if lines:
+                    num_columns = len(lines[0].split())
+            if data.strip():
+                blocks.append(np.array(data.split(), dtype=np.int64).reshape(-1, num_columns)[:, 0:2])
+            if not chunk:
+                break
+    edges = np.concatenate(blocks) if blocks else np.zeros((0, 2), dtype=np.int64)
+
+    vertex_ids = np.unique(edges)
+    edges = np.searchsorted(vertex_ids, edges)
+    offsets, indices = build_csr(len(vertex_ids), edges[:, 0], edges[:, 1])
+    return vertex_ids, offsets, indices
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as edge_file:
+        for chunk in iter(lambda: edge_file.read(CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_meta(meta_path, meta):
+    with open(meta_path + '.tmp', 'w') as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+if __name__ == '__main__':
+    import time
+
+    start = time.time()
+    vertex_ids, offsets, indices = load_graph('./stanford_large_network_facebook_combined.txt')
+    print("First load: {:.3f} s".format(time.time() - start))
+    start = time.time()
+    problem = load_graph_problem('./stanford_large_network_facebook_combined.txt', [349], 0)
+    print("Cached load: {:.3f} s".format(time.time() - start))
+    print("Vertices: {:}, edges: {:}".format(len(problem.vertex_ids), len(problem.indices) // 2))
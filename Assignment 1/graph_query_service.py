@@ -0,0 +1,190 @@
+import os
+from collections import defaultdict
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from search_problems import GraphSearchProblem, parent_path
+from breadth_first_search import csr_bfs
+from graph_loader import load_graph
+
+
+class GraphQueryService:
+    """
+    Answers batches of shortest-path queries (init_state, goal) over one graph that is loaded and indexed only once.
+    Queries that share an init_state are answered from a single breadth-first search tree, and batches can be spread
+    over a process pool whose workers read the CSR adjacency from shared memory instead of receiving a copy. The pool
+    is started by the first parallel batch and kept for the following ones until close, and batches too small to pay
+    for the inter-process traffic are solved in this process.
+
+    Paths are lists of states from init_state to goal, so they can be checked with
+    self.problem(init_state, goal).check_graph_solution(path).
+    """
+    def __init__(self, V, E):
+        index = GraphSearchProblem([], None, V, E)
+        self.vertex_ids = index.vertex_ids
+        self.offsets = index.offsets
+        self.indices = index.indices
+        self._shared = []
+        self._pool = None
+        self._pool_size = 0
+
+    @classmethod
+    def from_csr(cls, vertex_ids, offsets, indices):
+        # Service over an already built CSR adjacency (e.g. one loaded from a cache)
+        service = cls.__new__(cls)
+        service.vertex_ids = vertex_ids
+        service.offsets = offsets
+        service.indices = indices
+        service._shared = []
+        service._pool = None
+        service._pool_size = 0
+        return service
+
+    def problem(self, init_state, goal):
+        # GraphSearchProblem for one query that shares this service's adjacency
+        return GraphSearchProblem.from_csr([goal], init_state, self.vertex_ids, self.offsets, self.indices)
+
+    def query(self, init_state, goal):
+        return self.query_batch([(init_state, goal)])[0]
+
+    def query_batch(self, pairs, processes=None, min_parallel_sources=64):
+        """
+        Solves many shortest-path queries at once.
+
+        :param pairs: list of (init_state, goal) tuples
+        :param processes: number of worker processes (None or 1 solves the batch in this process; capped to the number
+                          of CPUs)
+        :param min_parallel_sources: batches with fewer distinct init_states are solved in this process
+        :return: list of paths (lists of states, [] when no path exists) in the same order as pairs
+        """
+        goals_by_source = defaultdict(set)
+        for init_state, goal in pairs:
+            goals_by_source[init_state].add(goal)
+        jobs = []
+        for init_state, goals in goals_by_source.items():
+            goals = list(goals)
+            jobs.append((init_state, goals, self._dense([init_state])[0], self._dense(goals)))
+
+        processes = min(processes or 1, os.cpu_count() or 1)
+        if processes <= 1 or len(jobs) < min_parallel_sources:
+            results = [solve_source(self.offsets, self.indices, job) for job in jobs]
+        else:
+            results = self._worker_pool(processes).map(solve_shared_source, jobs,
+                                                       chunksize=max(1, len(jobs) // (4 * processes)))
+
+        paths = {}
+        for init_state, goals, dense_paths in results:
+            for goal, dense_path in zip(goals, dense_paths):
+                paths[init_state, goal] = self.vertex_ids[dense_path].tolist()
+        return [paths[init_state, goal] for init_state, goal in pairs]
+
+    def close(self):
+        # Stops the worker processes and releases the shared memory blocks they used
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        for block in self._shared:
+            block.close()
+            block.unlink()
+        self._shared = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _dense(self, states):
+        # Dense indices of a list of states, -1 for states that are not vertices of the graph
+        states = np.asarray(states)
+        idx = np.minimum(np.searchsorted(self.vertex_ids, states), len(self.vertex_ids) - 1)
+        return np.where(self.vertex_ids[idx] == states, idx, -1)
+
+    def _worker_pool(self, processes):
+        # Pool of processes attached to the shared adjacency, started once and reused by later batches
+        if self._pool is not None and self._pool_size != processes:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self._pool is None:
+            self._pool = Pool(processes, initializer=attach_shared_graph, initargs=(self._share(),))
+            self._pool_size = processes
+        return self._pool
+
+    def _share(self):
+        # Copies the CSR arrays into shared memory once and returns what a worker needs to attach to them
+        if not self._shared:
+            for array in (self.offsets, self.indices):
+                block = SharedMemory(create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+                self._shared.append(block)
+        return [(block.name, array.shape, array.dtype.str)
+                for block, array in zip(self._shared, (self.offsets, self.indices))]
+
+
+def solve_source(offsets, indices, job):
+    """
+    Runs one breadth-first search from a query source until all of its goals are reached.
+
+    :param offsets: CSR row offsets
+    :param indices: CSR neighbour indices
+    :param job: tuple (init_state, goals, source, targets) where source and targets are the dense indices of
+                init_state and goals (-1 if not in the graph)
+    :return: tuple (init_state, goals, paths) where paths are lists of dense indices ([] when unreachable)
+    """
+    init_state, goals, source, targets = job
+    if source < 0:
+        return init_state, goals, [[] for goal in goals]
+    parent, num_nodes_expanded, max_frontier_size = csr_bfs(offsets, indices, source, targets[targets >= 0])
+    paths = [parent_path(parent, target) if target >= 0 and parent[target] >= 0 else [] for target in targets]
+    return init_state, goals, paths
+
+
+# CSR adjacency of the graph as seen by a worker process (attached in attach_shared_graph)
+_shared_graph = None
+
+
+def attach_shared_graph(blocks):
+    global _shared_graph
+    arrays = []
+    handles = []
+    for name, shape, dtype in blocks:
+        block = SharedMemory(name=name)
+        handles.append(block)
+        arrays.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf))
+    _shared_graph = (arrays[0], arrays[1], handles)
+
+
+def solve_shared_source(job):
+    offsets, indices, handles = _shared_graph
+    return solve_source(offsets, indices, job)
+
+
+if __name__ == '__main__':
+    import time
+
+    service = GraphQueryService.from_csr(*load_graph('./stanford_large_network_facebook_combined.txt'))
+    V = service.vertex_ids
+
+    # Many goals per source, as in a routing workload
+    sources = np.random.choice(V, 100, replace=False)
+    pairs = [(int(source), int(goal)) for source in sources for goal in np.random.choice(V, 40)]
+
+    start = time.time()
+    paths = service.query_batch(pairs)
+    print("Serial batch of {:} queries: {:.3f} s".format(len(pairs), time.time() - start))
+    for batch in range(3): # the first pooled batch also starts the pool and shares the graph
+        start = time.time()
+        shared_paths = service.query_batch(pairs, processes=4)
+        print("Pooled batch {:} of {:} queries on {:} CPUs: {:.3f} s".format(batch + 1, len(pairs), os.cpu_count(),
+                                                                           time.time() - start))
+    start = time.time()
+    service.query_batch(pairs[:40], processes=4)
+    print("Batch of 40 queries from one source (solved serially): {:.4f} s".format(time.time() - start))
+    service.close()
+
+    correct = all(service.problem(init_state, goal).check_graph_solution(path)
+                  for (init_state, goal), path in zip(pairs, shared_paths))
+    print("All solutions are correct: {:}".format(correct))
+    print("Serial and pooled path lengths agree: {:}".format([len(p) for p in paths] == [len(p) for p in shared_paths]))
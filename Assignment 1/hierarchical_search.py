@@ -0,0 +1,351 @@
+import heapq
+import numpy as np
+from search_problems import GridSearchProblem, get_random_grid_problem
+from instrumentation import NULL_STATS
+
+
+class HierarchicalGridPlanner:
+    """
+    Hierarchical path-finding (HPA*) over the grid of a GridSearchProblem, for answering many start/goal queries on the
+    same map. The grid is split into square clusters. Every maximal free stretch of a border between two clusters gets
+    one transition (two for stretches of at least 6 cells), whose two cells become nodes of an abstract graph joined by
+    a unit-cost edge. Inside each cluster, the nodes are joined by edges holding their shortest in-cluster distance.
+
+    The distance fields from every node to the cells of its cluster are kept, so a query reads the distances from start
+    and goal to the nodes of their clusters off them, searches the abstract graph with A*, and refines every abstract
+    edge back into grid cells by walking down a field; only a start and goal in the same cluster need a search, which
+    stops once it reaches the start. When a few cells change, update_cells only recomputes the borders and clusters
+    around them.
+    """
+    def __init__(self, problem, cluster_size=10):
+        self.problem = problem
+        self.M = problem.M
+        self.N = problem.N
+        self.cluster_size = cluster_size
+        self.clusters_x = -(-self.M // cluster_size)
+        self.clusters_y = -(-self.N // cluster_size)
+        self.transitions = {} # (cluster_a, cluster_b) -> list of (state_a, state_b) across that border
+        self.inter = {} # state -> set of states across a cluster border
+        self.nodes = {} # cluster -> set of abstract node states inside it
+        self.intra = {} # cluster -> {state: {state: in-cluster distance}}
+        self.fields = {} # cluster -> (ClusterDistances from its nodes, {node: source index in it})
+        clusters = range(self.clusters_x * self.clusters_y)
+        self.rebuild_borders(self.all_borders(clusters))
+        for cluster in clusters:
+            self.rebuild_cluster(cluster)
+
+    def get_cluster(self, state):
+        x, y = self.problem.get_position(state)
+        return (y // self.cluster_size) * self.clusters_x + x // self.cluster_size
+
+    def cluster_bounds(self, cluster):
+        # (x_start, x_end, y_start, y_end) of a cluster, end exclusive
+        cx, cy = cluster % self.clusters_x, cluster // self.clusters_x
+        size = self.cluster_size
+        return cx * size, min((cx + 1) * size, self.M), cy * size, min((cy + 1) * size, self.N)
+
+    def all_borders(self, clusters):
+        # Borders (cluster_a, cluster_b), cluster_a < cluster_b, between the given clusters and their neighbours
+        borders = set()
+        for cluster in clusters:
+            cx, cy = cluster % self.clusters_x, cluster // self.clusters_x
+            if cx > 0:
+                borders.add((cluster - 1, cluster))
+            if cx + 1 < self.clusters_x:
+                borders.add((cluster, cluster + 1))
+            if cy > 0:
+                borders.add((cluster - self.clusters_x, cluster))
+            if cy + 1 < self.clusters_y:
+                borders.add((cluster, cluster + self.clusters_x))
+        return borders
+
+    def rebuild_borders(self, borders):
+        occupancy = self.problem.occupancy
+        for border in borders:
+            for state_a, state_b in self.transitions.get(border, []):
+                self.inter[state_a].discard(state_b)
+                self.inter[state_b].discard(state_a)
+            cluster_a, cluster_b = border
+            x_start, x_end, y_start, y_end = self.cluster_bounds(cluster_a)
+            if cluster_b == cluster_a + self.clusters_x: # horizontal border: the last row of a and the first row of b
+                line = np.arange(x_start, x_end)
+                cells_a = self.problem.get_state(line, y_end - 1)
+                cells_b = cells_a + self.M
+                free = ~occupancy(x_start, x_end, y_end - 1, y_end + 1).any(axis=1)
+            else: # vertical border: the last column of a and the first column of b
+                line = np.arange(y_start, y_end)
+                cells_a = self.problem.get_state(x_end - 1, line)
+                cells_b = cells_a + 1
+                free = ~occupancy(x_end - 1, x_end + 1, y_start, y_end).any(axis=0)
+            # maximal runs of cells that are free on both sides of the border
+            edges = np.diff(np.concatenate(([0], free.astype(np.int8), [0])))
+            transitions = []
+            for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+                picks = (start, end - 1) if end - start >= 6 else ((start + end - 1) // 2,)
+                for pick in picks:
+                    state_a, state_b = int(cells_a[pick]), int(cells_b[pick])
+                    transitions.append((state_a, state_b))
+                    self.inter.setdefault(state_a, set()).add(state_b)
+                    self.inter.setdefault(state_b, set()).add(state_a)
+            self.transitions[border] = transitions
+
+    def rebuild_cluster(self, cluster):
+        # Recomputes the abstract nodes of a cluster and the in-cluster distances between them
+        nodes = set()
+        for border in self.all_borders([cluster]):
+            for state_a, state_b in self.transitions[border]:
+                nodes.add(state_a if border[0] == cluster else state_b)
+        self.nodes[cluster] = nodes
+        nodes = sorted(nodes)
+        distances = self.cluster_distances(cluster, nodes)
+        self.fields[cluster] = (distances, {node: idx for idx, node in enumerate(nodes)})
+        self.intra[cluster] = {}
+        for idx, node in enumerate(nodes):
+            self.intra[cluster][node] = {}
+            for other in nodes:
+                distance = distances.get(idx, other)
+                if other != node and distance >= 0:
+                    self.intra[cluster][node][other] = distance
+
+    def cluster_distances(self, cluster, sources, targets=()):
+        """
+        Breadth-first searches restricted to one cluster, run for all sources at once on stacked boolean masks.
+
+        :param cluster: cluster id
+        :param sources: list of states inside the cluster
+        :param targets: states inside the cluster; when given, the searches stop as soon as every source reached all of
+                        them (cells farther away than that are left unreached)
+        :return: ClusterDistances holding the distance from every source to every cell of the cluster
+        """
+        x_start, x_end, y_start, y_end = self.cluster_bounds(cluster)
+        free = ~self.problem.occupancy(x_start, x_end, y_start, y_end)
+        distances = np.full((len(sources), x_end - x_start, y_end - y_start), -1, dtype=np.int32)
+        frontier = np.zeros(distances.shape, dtype=bool)
+        for idx, source in enumerate(sources):
+            x, y = self.problem.get_position(source)
+            frontier[idx, x - x_start, y - y_start] = True
+        reached = frontier.copy()
+        distances[frontier] = 0
+        target_x = [state % self.M - x_start for state in targets]
+        target_y = [state // self.M - y_start for state in targets]
+        level = 0
+        while frontier.any() and not (targets and reached[:, target_x, target_y].all()):
+            level += 1
+            grown = np.zeros_like(frontier)
+            grown[:, 1:, :] |= frontier[:, :-1, :]
+            grown[:, :-1, :] |= frontier[:, 1:, :]
+            grown[:, :, 1:] |= frontier[:, :, :-1]
+            grown[:, :, :-1] |= frontier[:, :, 1:]
+            frontier = grown & free & ~reached
+            reached |= frontier
+            distances[frontier] = level
+        return ClusterDistances(distances, x_start, y_start, self.M)
+
+    def update_cells(self, changes):
+        """
+        Changes the occupancy of a few cells (see GridSearchProblem.set_cells) and repairs the abstract graph around
+        them instead of rebuilding it.
+
+        :param changes: iterable of (state, occupied) pairs
+        """
+        changes = list(changes)
+        self.problem.set_cells(changes)
+        changed = {self.get_cluster(state) for state, occupied in changes}
+        borders = self.all_borders(changed)
+        self.rebuild_borders(borders)
+        for cluster in changed.union(*borders):
+            self.rebuild_cluster(cluster)
+
+    def find_path(self, init_state, goal_state, stats=NULL_STATS):
+        """
+        Answers one query on the abstract graph.
+
+        :param stats: SearchStats to report counters, phase times and frontier sizes into (see instrumentation); the
+                      abstract nodes and the cells are also counted apart, as abstract_expanded and cells_expanded
+        :return: path: a list of states from init_state to goal_state ([] if there is none)
+                 num_nodes_expanded: abstract nodes expanded, plus cells reached by the search joining a start and
+                                     goal in the same cluster and cells walked through while refining
+        """
+        stats.begin('hpa_star')
+        heuristic = stats.timed('heuristic', self.problem.manhattan_heuristic)
+        instrumented = stats.enabled
+        num_abstract_expanded = 0
+        num_cells_expanded = 0
+        num_pushes = 0
+        num_pops = 0
+        try:
+            if self.problem.is_blocked(init_state) or self.problem.is_blocked(goal_state):
+                return [], 0
+            if init_state == goal_state:
+                return [init_state], 0
+            init_cluster, goal_cluster = self.get_cluster(init_state), self.get_cluster(goal_state)
+
+            # connect start and goal to the abstract nodes of their clusters, reading the distances off the node fields
+            endpoints = {}
+            for state, cluster in ((init_state, init_cluster), (goal_state, goal_cluster)):
+                fields, index = self.fields[cluster]
+                endpoints[state] = {node: fields.get(idx, state) for node, idx in index.items()
+                                    if fields.get(idx, state) >= 0}
+            direct = -1
+            if init_cluster == goal_cluster:
+                direct_distances = self.cluster_distances(init_cluster, [goal_state], targets=[init_state])
+                num_cells_expanded += direct_distances.num_reached()
+                direct = direct_distances.get(0, init_state)
+
+            def neighbours(state):
+                if state in endpoints: # start or goal
+                    yield from endpoints[state].items()
+                if state == init_state and direct >= 0:
+                    yield goal_state, direct
+                cluster = self.get_cluster(state)
+                yield from self.intra[cluster].get(state, {}).items()
+                for other in self.inter.get(state, ()):
+                    yield other, 1
+                if goal_state in endpoints and state in endpoints[goal_state]:
+                    yield goal_state, endpoints[goal_state][state]
+
+            # A* over the abstract graph
+            best_cost = {init_state: 0}
+            parent = {init_state: None}
+            frontier = [(heuristic(init_state, goal_state), 0, init_state)]
+            num_pushes += 1
+            closed = set()
+            while frontier:
+                if instrumented:
+                    stats.sample_frontier(num_abstract_expanded, len(frontier))
+                f, cost, node = heapq.heappop(frontier)
+                num_pops += 1
+                if node in closed:
+                    continue
+                if node == goal_state:
+                    break
+                closed.add(node)
+                num_abstract_expanded += 1
+                for child, step in neighbours(node):
+                    child_cost = cost + step
+                    if child not in closed and child_cost < best_cost.get(child, float('inf')):
+                        best_cost[child] = child_cost
+                        parent[child] = node
+                        heapq.heappush(frontier, (child_cost + heuristic(child, goal_state), child_cost, child))
+                        num_pushes += 1
+            else:
+                return [], num_abstract_expanded + num_cells_expanded
+
+            # refine the abstract path into grid cells
+            abstract_path = [goal_state]
+            while parent[abstract_path[-1]] is not None:
+                abstract_path.append(parent[abstract_path[-1]])
+            abstract_path.reverse()
+            path = [init_state]
+            for node, next_node in zip(abstract_path[:-1], abstract_path[1:]):
+                if next_node in self.inter.get(node, ()) and self.get_cluster(node) != self.get_cluster(next_node):
+                    path.append(next_node)
+                    continue
+                if (node, next_node) == (init_state, goal_state):
+                    segment = self.descend(direct_distances, 0, init_state)
+                else:
+                    segment = self.local_path(node, next_node)
+                if not segment:
+                    return [], num_abstract_expanded + num_cells_expanded
+                path.extend(segment[1:])
+                num_cells_expanded += len(segment) - 1 # every cell walked through had its successors looked at
+            return path, num_abstract_expanded + num_cells_expanded
+        finally:
+            stats.end(expanded=num_abstract_expanded + num_cells_expanded, abstract_expanded=num_abstract_expanded,
+                      cells_expanded=num_cells_expanded, heap_push=num_pushes, heap_pop=num_pops)
+
+    def local_path(self, state_a, state_b):
+        # Shortest path between two cells of the same cluster, one of them an abstract node, staying inside the cluster
+        fields, index = self.fields[self.get_cluster(state_a)]
+        if state_b in index:
+            return self.descend(fields, index[state_b], state_a)
+        return self.descend(fields, index[state_a], state_b)[::-1]
+
+    def descend(self, distances, source, state):
+        """
+        Walks down a distance field from state to the source of the field.
+
+        :param distances: ClusterDistances
+        :param source: index of the source in distances
+        :param state: state the walk starts from
+        :return: path: a list of states from state to the source ([] if the source cannot be reached from state)
+        """
+        distance = distances.get(source, state)
+        if distance < 0:
+            return []
+        path = [state]
+        while distance > 0:
+            for child in self.problem.get_successors(path[-1]).tolist():
+                if distances.get(source, child) == distance - 1:
+                    path.append(child)
+                    break
+            else:
+                return [] # no neighbour one step closer: the field does not belong to this grid any more
+            distance -= 1
+        return path
+
+
+class ClusterDistances:
+    """
+    Distances computed by HierarchicalGridPlanner.cluster_distances, indexed by grid state.
+    """
+    def __init__(self, distances, x_start, y_start, M):
+        self.distances = distances # int32 array indexed [source, x - x_start, y - y_start], -1 where unreachable
+        self.x_start = x_start
+        self.y_start = y_start
+        self.M = M
+
+    def get(self, source, state):
+        # distance from sources[source] to state (-1 if state is unreachable or outside the cluster)
+        width = self.distances.shape[1]
+        height = self.distances.shape[2]
+        x = state % self.M - self.x_start
+        y = state // self.M - self.y_start
+        if 0 <= x < width and 0 <= y < height:
+            return int(self.distances[source, x, y])
+        return -1
+
+    def num_reached(self):
+        return int(np.count_nonzero(self.distances >= 0))
+
+
+if __name__ == '__main__':
+    import copy
+    import time
+    from a_star_search import a_star_search
+
+    p_occ = 0.25
+    M = 500
+    N = 500
+    problem = get_random_grid_problem(p_occ, M, N)
+    start = time.time()
+    planner = HierarchicalGridPlanner(problem, cluster_size=20)
+    print("Preprocessing: {:.2f} s".format(time.time() - start))
+
+    free_states = np.flatnonzero(~problem.blocked_states())
+    totals = np.zeros(6)
+    queries = 0
+    for query in range(50):
+        if query == 25: # flip a few cells and repair the abstract graph
+            changes = [(int(state), bool(np.random.rand() < 0.5)) for state in np.random.choice(M * N, 10)]
+            start = time.time()
+            planner.update_cells(changes)
+            print("Update of 10 cells: {:.3f} s".format(time.time() - start))
+            free_states = np.flatnonzero(~problem.blocked_states())
+        init_state, goal_state = (int(state) for state in np.random.choice(free_states, 2))
+        query_problem = copy.copy(problem) # same grid and neighbour table, different start and goal
+        query_problem.init_state, query_problem.goal_states = init_state, [goal_state]
+        start = time.time()
+        path, num_nodes_expanded, max_frontier_size = a_star_search(query_problem)
+        a_star_time = time.time() - start
+        start = time.time()
+        hpa_path, hpa_expanded = planner.find_path(init_state, goal_state)
+        hpa_time = time.time() - start
+        assert (not path and not hpa_path) or query_problem.check_solution(hpa_path)
+        if path:
+            queries += 1
+            totals += [a_star_time, hpa_time, num_nodes_expanded, hpa_expanded, len(path), len(hpa_path)]
+    totals /= queries
+    print("Average A* time: {:.4f} s, HPA* time: {:.4f} s".format(totals[0], totals[1]))
+    print("Average A* nodes expanded: {:.0f}, HPA* nodes expanded: {:.0f}".format(totals[2], totals[3]))
+    print("Average path length A*: {:.1f}, HPA*: {:.1f}".format(totals[4], totals[5]))
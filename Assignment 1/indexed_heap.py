@@ -0,0 +1,163 @@
+
+class IndexedMinHeap:
+    """
+    Binary min-heap over integer ids (e.g. states) in [0, capacity) with decrease-key. Every id appears at most once, so
+    the heap size is the number of distinct open ids. Ids are ordered by f, ties are broken toward larger g and then
+    toward the smaller id, which makes the pop order deterministic. The f and g values and the heap position of every
+    id live in flat lists indexed by id. There is no locking: the heap is meant to be owned by a single search.
+    """
+    def __init__(self, capacity):
+        self.heap = [] # ids in heap order
+        self.position = [-1] * capacity # position of each id in self.heap, -1 when not in the heap
+        self.f = [0] * capacity
+        self.g = [0] * capacity
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, item):
+        return self.position[item] >= 0
+
+    def push(self, item, f, g):
+        """
+        Inserts item, or lowers its key if it is already in the heap and the new key comes first.
+
+        :return: True if the heap changed
+        """
+        pos = self.position[item]
+        if pos >= 0:
+            if not self.before(f, g, item, self.f[item], self.g[item], item):
+                return False
+        else:
+            pos = len(self.heap)
+            self.heap.append(item)
+            self.position[item] = pos
+        self.f[item] = f
+        self.g[item] = g
+        self.sift_up(pos)
+        return True
+
+    def clear(self):
+        # Empties the heap in time proportional to its size, so it can be reused for another search of the same ids
+        for item in self.heap:
+            self.position[item] = -1
+        self.heap = []
+
+    def peek(self):
+        return self.heap[0]
+
+    def pop(self):
+        # Removes and returns the id with the smallest key
+        heap = self.heap
+        top = heap[0]
+        last = heap.pop()
+        self.position[top] = -1
+        if heap:
+            heap[0] = last
+            self.position[last] = 0
+            self.sift_down(0)
+        return top
+
+    def remove(self, item):
+        # Removes item from the heap (it must be in it)
+        heap, position = self.heap, self.position
+        pos = position[item]
+        last = heap.pop()
+        position[item] = -1
+        if pos < len(heap):
+            heap[pos] = last
+            position[last] = pos
+            self.sift_down(pos)
+            self.sift_up(position[last])
+
+    @staticmethod
+    def before(f1, g1, item1, f2, g2, item2):
+        # Heap order: smaller f, then larger g, then smaller id
+        if f1 != f2:
+            return f1 < f2
+        if g1 != g2:
+            return g1 > g2
+        return item1 < item2
+
+    def sift_up(self, pos):
+        # the heap order test is spelled out inline (see before) since this is the hot loop of every search
+        heap, position, f, g = self.heap, self.position, self.f, self.g
+        item = heap[pos]
+        item_f, item_g = f[item], g[item]
+        while pos > 0:
+            parent_pos = (pos - 1) >> 1
+            parent = heap[parent_pos]
+            parent_f = f[parent]
+            if item_f > parent_f or (item_f == parent_f and (item_g < g[parent] or
+                                                             (item_g == g[parent] and item > parent))):
+                break
+            heap[pos] = parent
+            position[parent] = pos
+            pos = parent_pos
+        heap[pos] = item
+        position[item] = pos
+
+    def sift_down(self, pos):
+        heap, position, f, g = self.heap, self.position, self.f, self.g
+        size = len(heap)
+        item = heap[pos]
+        item_f, item_g = f[item], g[item]
+        while True:
+            child_pos = 2 * pos + 1
+            if child_pos >= size:
+                break
+            child = heap[child_pos]
+            child_f = f[child]
+            right_pos = child_pos + 1
+            if right_pos < size:
+                right = heap[right_pos]
+                right_f = f[right]
+                if right_f < child_f or (right_f == child_f and (g[right] > g[child] or
+                                                                 (g[right] == g[child] and right < child))):
+                    child_pos, child, child_f = right_pos, right, right_f
+            if child_f > item_f or (child_f == item_f and (g[child] < item_g or
+                                                           (g[child] == item_g and child > item))):
+                break
+            heap[pos] = child
+            position[child] = pos
+            pos = child_pos
+        heap[pos] = item
+        position[item] = pos
+
+
+class SparseIndexedMinHeap(IndexedMinHeap):
+    """
+    IndexedMinHeap whose f and g values and heap positions are dictionaries holding only the ids pushed so far, for ids
+    spanning a range too large to allocate flat lists over (e.g. the states of a city-scale grid). It is slower per
+    operation than the flat lists.
+    """
+    def __init__(self):
+        self.heap = []
+        self.position = {} # ids that left the heap keep position -1, ids never pushed are missing
+        self.f = {}
+        self.g = {}
+
+    def __contains__(self, item):
+        return self.position.get(item, -1) >= 0
+
+    def clear(self):
+        # Forgets every id pushed so far, so the dictionaries do not keep growing over reused searches
+        self.heap = []
+        self.position = {}
+        self.f = {}
+        self.g = {}
+
+    def push(self, item, f, g):
+        # Inserts item, or lowers its key if it is already in the heap and the new key comes first
+        pos = self.position.get(item, -1)
+        if pos >= 0:
+            if not self.before(f, g, item, self.f[item], self.g[item], item):
+                return False
+        else:
+            pos = len(self.heap)
+            self.heap.append(item)
+            self.position[item] = pos
+        self.f[item] = f
+        self.g[item] = g
+        self.sift_up(pos)
+        return True
@@ -0,0 +1,171 @@
+import json
+import time
+from collections import defaultdict
+
+TIMED_METHODS = ('get_actions', 'get_child_node', 'heuristic', 'manhattan_heuristic', 'batch_heuristic',
+                 'batch_manhattan_heuristic')
+
+
+class SearchStats:
+    """
+    Instrumentation that a solver reports into, passed as its `stats` argument. It collects named counters (expanded,
+    generated, duplicates, heap pushes and pops...), the time and number of calls of each phase (the problem methods in
+    TIMED_METHODS are timed through wrap), and a trace of the frontier size against the number of nodes expanded.
+
+    Solvers default to NULL_STATS, which has the same methods doing nothing; they only touch the instrumentation
+    through cheap checks of `enabled` and counts that they report once at the end, so a disabled run costs next to
+    nothing. One SearchStats can collect several searches in a row: counters and timers add up, and each search is
+    recorded in the frontier trace under its solver name.
+    """
+    enabled = True
+
+    def __init__(self, sample_every=1):
+        self.sample_every = sample_every # keep one frontier sample every this many expansions
+        self.counters = defaultdict(int) # (solver, counter) -> value
+        self.timers = defaultdict(float) # (solver, phase) -> seconds
+        self.calls = defaultdict(int) # (solver, phase) -> number of timed calls
+        self.frontier = defaultdict(list) # solver -> [(nodes expanded, frontier size)]
+        self.solver = None
+        self.started = None
+
+    def begin(self, solver):
+        self.solver = solver
+        self.started = time.perf_counter()
+
+    def end(self, **counters):
+        # Closes the current search, adding the final values of the solver's own counters
+        for name, value in counters.items():
+            self.count(name, value)
+        self.add_time('total', time.perf_counter() - self.started)
+        self.solver = None
+
+    def count(self, name, amount=1):
+        self.counters[self.solver, name] += amount
+
+    def add_time(self, phase, seconds, calls=1):
+        self.timers[self.solver, phase] += seconds
+        self.calls[self.solver, phase] += calls
+
+    def sample_frontier(self, num_nodes_expanded, frontier_size):
+        if num_nodes_expanded % self.sample_every == 0:
+            self.frontier[self.solver].append((num_nodes_expanded, frontier_size))
+
+    def wrap(self, problem):
+        # Problem whose TIMED_METHODS are timed into this object (everything else goes to problem untouched)
+        return TimedProblem(problem, self)
+
+    def timed(self, phase, function):
+        # function with its calls timed into phase, for the phases that are not problem methods (e.g. a landmark table)
+        def timed_function(*args, **kwargs):
+            started = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.add_time(phase, time.perf_counter() - started)
+            return result
+        return timed_function
+
+    def to_dict(self):
+        solvers = {}
+        for (solver, name), value in self.counters.items():
+            solvers.setdefault(solver, {'counters': {}, 'timers': {}, 'calls': {}})['counters'][name] = value
+        for (solver, phase), seconds in self.timers.items():
+            entry = solvers.setdefault(solver, {'counters': {}, 'timers': {}, 'calls': {}})
+            entry['timers'][phase] = seconds
+            entry['calls'][phase] = self.calls[solver, phase]
+        for solver, samples in self.frontier.items():
+            solvers.setdefault(solver, {'counters': {}, 'timers': {}, 'calls': {}})['frontier'] = samples
+        return solvers
+
+    def save_json(self, path):
+        with open(path, 'w') as stats_file:
+            json.dump(self.to_dict(), stats_file, indent=1)
+
+    def folded(self):
+        """
+        Flame-graph summary in the folded stack format ("solver;phase microseconds" per line, the solver line holding
+        the time not spent in any timed phase), which flamegraph.pl and speedscope read directly.
+        """
+        lines = []
+        for solver, entry in self.to_dict().items():
+            timers = entry['timers']
+            phases = sum(seconds for phase, seconds in timers.items() if phase != 'total')
+            lines.append("{:} {:.0f}".format(solver, max(timers.get('total', 0) - phases, 0) * 1e6))
+            for phase, seconds in sorted(timers.items()):
+                if phase != 'total':
+                    lines.append("{:};{:} {:.0f}".format(solver, phase, seconds * 1e6))
+        return "\n".join(lines)
+
+
+class NullStats:
+    # Disabled instrumentation: the default `stats` of every solver
+    enabled = False
+
+    def begin(self, solver):
+        pass
+
+    def end(self, **counters):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+    def add_time(self, phase, seconds, calls=1):
+        pass
+
+    def sample_frontier(self, num_nodes_expanded, frontier_size):
+        pass
+
+    def wrap(self, problem):
+        return problem
+
+    def timed(self, phase, function):
+        return function
+
+
+NULL_STATS = NullStats()
+
+
+class TimedProblem:
+    """
+    Stand-in for a search problem that times the calls of its TIMED_METHODS into a SearchStats. Any other attribute is
+    read from the wrapped problem.
+    """
+    def __init__(self, problem, stats):
+        self.problem = problem
+        self.stats = stats
+
+    def __getattr__(self, name):
+        attribute = getattr(self.problem, name)
+        if name not in TIMED_METHODS:
+            return attribute
+        timed = self.stats.timed(name, attribute)
+        setattr(self, name, timed) # later lookups skip __getattr__
+        return timed
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import numpy as np
+    from search_problems import GridSearchProblem
+    from breadth_first_search import breadth_first_search
+    from bidirectional_search import bidirectional_search
+    from a_star_search import a_star_search
+
+    np.random.seed(0)
+    grid_map = np.random.rand(300, 300) <= 0.25
+    problem = GridSearchProblem([300 * 300 - 1], 0, 300, 300, grid_map) # corner to corner
+    stats = SearchStats(sample_every=100)
+    for solver in (breadth_first_search, bidirectional_search, a_star_search):
+        start = time.perf_counter()
+        solver(problem)
+        disabled_time = time.perf_counter() - start
+        start = time.perf_counter()
+        path, num_nodes_expanded, max_frontier_size = solver(problem, stats=stats)
+        print("{:20}  {:.3f} s disabled, {:.3f} s enabled, {:} nodes expanded".format(
+            solver.__name__, disabled_time, time.perf_counter() - start, num_nodes_expanded))
+    for solver, entry in stats.to_dict().items():
+        print(solver, dict(entry['counters']))
+    print(stats.folded())
+    with tempfile.TemporaryDirectory() as directory:
+        stats.save_json(os.path.join(directory, 'stats.json'))
+        print("JSON export: {:} bytes".format(os.path.getsize(os.path.join(directory, 'stats.json'))))
@@ -0,0 +1,148 @@
+import numpy as np
+from search_problems import GridSearchProblem, get_random_grid_problem
+from indexed_heap import IndexedMinHeap
+from a_star_search import a_star_search
+from instrumentation import NULL_STATS
+
+
+def jump_point_search(problem, stats=NULL_STATS):
+    """
+    Jump Point Search for the 4-connected, unit-cost GridSearchProblem. Instead of pushing every neighbour, the search
+    jumps in a straight line until it reaches the goal or a jump point: a cell with a forced neighbour (a side cell that
+    is free while the cell behind it is occupied), or, when moving vertically, a cell from which a horizontal jump
+    reaches a jump point. Only jump points enter the open list, so the many equivalent paths of open maps are skipped.
+
+    :param problem: an instance of GridSearchProblem to solve
+    :param stats: SearchStats to report counters, phase times and frontier sizes into (see instrumentation)
+    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0], with
+                   every intermediate cell between jump points filled in (so problem.check_solution accepts it)
+             num_nodes_expanded: number of jump points expanded
+             max_frontier_size: maximum frontier size during search
+    """
+    stats.begin('jump_point_search')
+    problem = stats.wrap(problem) # times manhattan_heuristic when stats is enabled
+    instrumented = stats.enabled
+    M, N = problem.M, problem.N
+    goal_state = problem.goal_states[0]
+    state = problem.init_state
+    if goal_state == state:
+        stats.end()
+        return [state], 0, 0
+    blocked = problem.blocked_states().tobytes() # one byte per state, fast to index from Python
+    goal_x, goal_y = problem.get_position(goal_state)
+
+    def walkable(x, y):
+        return 0 <= x < M and 0 <= y < N and not blocked[y*M + x]
+
+    def jump_horizontal(x, y, dx):
+        while True:
+            x += dx
+            if not walkable(x, y):
+                return -1
+            if x == goal_x and y == goal_y:
+                return y*M + x
+            if (walkable(x, y-1) and not walkable(x-dx, y-1)) or (walkable(x, y+1) and not walkable(x-dx, y+1)):
+                return y*M + x # forced neighbour above or below
+
+    def jump_vertical(x, y, dy):
+        while True:
+            y += dy
+            if not walkable(x, y):
+                return -1
+            if x == goal_x and y == goal_y:
+                return y*M + x
+            if (walkable(x-1, y) and not walkable(x-1, y-dy)) or (walkable(x+1, y) and not walkable(x+1, y-dy)):
+                return y*M + x # forced neighbour to the left or right
+            if jump_horizontal(x, y, 1) >= 0 or jump_horizontal(x, y, -1) >= 0:
+                return y*M + x # a horizontal branch from here leads somewhere
+
+    frontier = IndexedMinHeap(M*N)
+    frontier.push(state, problem.manhattan_heuristic(state, goal_state), 0)
+    best_cost = {state: 0}
+    parent = {state: state}
+    closed = set()
+    max_frontier_size = 0
+    num_nodes_expanded = 0
+    num_jump_points = 0 # jump points found from expanded nodes
+    num_pushes = 1
+    path = []
+
+    while len(frontier) != 0:
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        if instrumented:
+            stats.sample_frontier(num_nodes_expanded, len(frontier))
+        node = frontier.pop()
+        if node == goal_state:
+            path = fill_path(problem, parent, goal_state)
+            break
+        closed.add(node)
+        num_nodes_expanded += 1
+        x, y = problem.get_position(node)
+        if parent[node] == node:
+            directions = ((1, 0), (-1, 0), (0, 1), (0, -1)) # every direction is open at the start
+        else:
+            px, py = problem.get_position(parent[node])
+            dx, dy = (x > px) - (x < px), (y > py) - (y < py)
+            if dx != 0: # pruned neighbours: keep going, or turn onto the vertical
+                directions = ((dx, 0), (0, 1), (0, -1))
+            else:
+                directions = ((0, dy), (1, 0), (-1, 0))
+        for dx, dy in directions:
+            if dx != 0:
+                child = jump_horizontal(x, y, dx)
+            else:
+                child = jump_vertical(x, y, dy)
+            if child < 0:
+                continue
+            num_jump_points += 1
+            if child in closed:
+                continue
+            child_cost = best_cost[node] + problem.manhattan_heuristic(node, child) # straight line between the two
+            if child_cost < best_cost.get(child, float('inf')):
+                best_cost[child] = child_cost
+                parent[child] = node
+                frontier.push(child, child_cost + problem.manhattan_heuristic(child, goal_state), child_cost)
+                num_pushes += 1
+
+    num_pops = num_nodes_expanded + (len(path) != 0)
+    stats.end(expanded=num_nodes_expanded, generated=num_jump_points, heap_push=num_pushes, heap_pop=num_pops,
+              decrease_key=num_pushes - num_pops - len(frontier))
+    return path, num_nodes_expanded, max_frontier_size
+
+
+def fill_path(problem, parent, goal_state):
+    # Follows the jump point parents back to the start, adding every cell of the straight segments in between
+    path = [goal_state]
+    node = goal_state
+    while parent[node] != node:
+        x, y = problem.get_position(node)
+        px, py = problem.get_position(parent[node])
+        dx, dy = (px > x) - (px < x), (py > y) - (py < y)
+        while (x, y) != (px, py):
+            x, y = x + dx, y + dy
+            path.append(problem.get_state(x, y))
+        node = parent[node]
+    path.reverse()
+    return path
+
+
+if __name__ == '__main__':
+    # Compare with A* over the phase transition sweep
+    M = 200
+    N = 200
+    trials = 20
+    print("p_occ   solved   A* expanded   JPS expanded")
+    for p_occ in np.linspace(0.1, 0.45, 8):
+        solved = 0
+        a_star_expanded = 0
+        jps_expanded = 0
+        for trial in range(trials):
+            problem = get_random_grid_problem(p_occ, M, N)
+            path, num_nodes_expanded, max_frontier_size = a_star_search(problem)
+            a_star_expanded += num_nodes_expanded
+            jps_path, num_nodes_expanded, max_frontier_size = jump_point_search(problem)
+            jps_expanded += num_nodes_expanded
+            assert len(jps_path) == len(path) and (not path or problem.check_solution(jps_path))
+            solved += path != []
+        print("{:5.3f}   {:6.2f}   {:11.0f}   {:12.0f}".format(p_occ, solved / trials, a_star_expanded / trials,
+                                                           jps_expanded / trials))
@@ -0,0 +1,334 @@
+import heapq
+import os
+import numpy as np
+from search_problems import GraphSearchProblem, parent_path
+from breadth_first_search import csr_bfs, csr_bfs_distances
+from instrumentation import NULL_STATS
+
+
+class LandmarkTable:
+    """
+    Landmark distances for the ALT (A*, Landmarks, Triangle inequality) heuristic on an unweighted, undirected graph.
+    distances[v, i] is the hop distance between dense vertex v and landmark i, so for any vertices v and t,
+    |distances[v, i] - distances[t, i]| is a lower bound on the distance between v and t, and the largest such bound
+    over all landmarks is a consistent A* heuristic.
+
+    The table is a (num_vertices, k) uint16 matrix (uint32 if some distance does not fit), with the largest value of the
+    type marking vertices a landmark cannot reach. Rows are contiguous, so the bounds for a handful of vertices are a
+    single fancy-indexing operation, and the matrix can be saved and memory-mapped back.
+    """
+    def __init__(self, landmarks, distances):
+        self.landmarks = landmarks # dense indices of the landmarks
+        self.distances = distances
+        self.unreached = np.iinfo(distances.dtype).max
+
+    @classmethod
+    def build(cls, offsets, indices, k=16, strategy='avoid', seed=0):
+        """
+        Chooses k landmarks and runs a breadth-first search from each of them.
+
+        :param offsets: CSR row offsets
+        :param indices: CSR neighbour indices
+        :param k: number of landmarks (fewer are kept if the graph has fewer vertices)
+        :param strategy: 'farthest' (every landmark is the vertex farthest from the ones already chosen) or 'avoid'
+                         (every landmark is a leaf of a shortest-path tree from a random root, in the subtree where the
+                         current landmarks give the worst lower bounds)
+        :param seed: seed for the random start and roots
+        :return: LandmarkTable
+        """
+        if strategy not in ('farthest', 'avoid'):
+            raise ValueError("Unknown landmark selection strategy: " + str(strategy))
+        num_vertices = len(offsets) - 1
+        rng = np.random.default_rng(seed)
+        # the first landmark is the vertex farthest from a random start (unreachable vertices count as farthest)
+        closest = hops(csr_bfs_distances(offsets, indices, int(rng.integers(num_vertices))), num_vertices)
+        landmarks = []
+        columns = []
+        while len(landmarks) < min(k, num_vertices):
+            landmark = -1
+            if strategy == 'avoid' and landmarks:
+                landmark = avoid_landmark(offsets, indices, np.column_stack(columns), landmarks,
+                                          int(rng.integers(num_vertices)))
+            if landmark < 0:
+                landmark = int(np.argmax(closest))
+                if closest[landmark] == 0:
+                    break # every vertex already is a landmark
+            distance = csr_bfs_distances(offsets, indices, landmark)
+            landmarks.append(landmark)
+            columns.append(distance)
+            closest = np.minimum(closest, hops(distance, num_vertices))
+
+        distances = np.column_stack(columns)
+        dtype = np.uint16 if distances.max() < np.iinfo(np.uint16).max else np.uint32
+        distances = np.where(distances < 0, np.iinfo(dtype).max, distances).astype(dtype)
+        return cls(np.array(landmarks, dtype=np.int64), distances)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'landmarks.npy'), self.landmarks)
+        np.save(os.path.join(directory, 'distances.npy'), self.distances)
+
+    @classmethod
+    def load(cls, directory):
+        # Table saved with save(); the distance matrix is memory-mapped rather than read
+        return cls(np.load(os.path.join(directory, 'landmarks.npy')),
+                   np.load(os.path.join(directory, 'distances.npy'), mmap_mode='r'))
+
+    def heuristic(self, vertices, goal):
+        """
+        ALT lower bounds on the distance from each of vertices to goal.
+
+        :param vertices: numpy array of dense vertex indices
+        :param goal: dense index of the goal
+        :return: numpy float array of lower bounds (inf for vertices that are known not to be connected to goal)
+        """
+        rows = self.distances[vertices].astype(np.int64)
+        goal_row = self.distances[goal].astype(np.int64)
+        bounds = np.abs(rows - goal_row)
+        reached = rows != self.unreached
+        goal_reached = goal_row != self.unreached
+        bounds[~(reached & goal_reached)] = 0 # a landmark outside the component says nothing
+        h = bounds.max(axis=1).astype(float)
+        h[np.any(reached != goal_reached, axis=1)] = np.inf # one of the two is in the landmark's component
+        return h
+
+
+def hops(distance, num_vertices):
+    # Distances with unreachable vertices (-1) counted as farther than anything reachable
+    return np.where(distance < 0, num_vertices, distance)
+
+
+def avoid_landmark(offsets, indices, distances, landmarks, root):
+    """
+    One step of the 'avoid' landmark selection (Goldberg & Harrelson): grows a shortest-path tree from root, weights
+    every vertex by how much the current landmarks underestimate its distance to root, and walks down from the heaviest
+    subtree without a landmark to one of its leaves.
+
+    :param offsets: CSR row offsets
+    :param indices: CSR neighbour indices
+    :param distances: (num_vertices, number of landmarks) int array of distances to the current landmarks (-1 if
+                      unreached)
+    :param landmarks: dense indices of the current landmarks
+    :param root: dense index of the root of the tree
+    :return: dense index of the new landmark (-1 if every subtree already contains a landmark)
+    """
+    parent, num_nodes_expanded, max_frontier_size = csr_bfs(offsets, indices, root)
+    depth = csr_bfs_distances(offsets, indices, root)
+    reached = np.flatnonzero(depth >= 0)
+    both = (distances[reached] >= 0) & (distances[root] >= 0)
+    bound = np.where(both, np.abs(distances[reached] - distances[root]), 0).max(axis=1)
+    size = np.zeros(len(parent))
+    size[reached] = depth[reached] - bound
+    covered = np.zeros(len(parent), dtype=bool)
+    covered[landmarks] = True
+    for level in range(depth.max(), 0, -1): # accumulate the subtrees from the deepest level up
+        vertices = np.flatnonzero(depth == level)
+        np.add.at(size, parent[vertices], size[vertices])
+        np.logical_or.at(covered, parent[vertices], covered[vertices])
+    size[covered] = 0
+    vertex = int(np.argmax(size))
+    if size[vertex] <= 0:
+        return -1
+    tree = reached[np.argsort(parent[reached], kind='stable')] # tree children grouped by parent
+    child_start = np.searchsorted(parent[tree], np.arange(len(parent)))
+    child_end = np.searchsorted(parent[tree], np.arange(len(parent)), side='right')
+    while True:
+        children = tree[child_start[vertex]:child_end[vertex]]
+        children = children[children != vertex] # the root is its own parent
+        if len(children) == 0:
+            return vertex
+        vertex = int(children[np.argmax(size[children])])
+
+
+def alt_a_star_search(problem, table, stats=NULL_STATS):
+    """
+    A* over the CSR adjacency of a GraphSearchProblem, guided by the ALT heuristic of a LandmarkTable built for the
+    same graph. The heuristic is consistent, so every vertex is expanded at most once.
+
+    :param problem: instance of GraphSearchProblem
+    :param table: LandmarkTable of problem's graph
+    :param stats: SearchStats to report counters, phase times and frontier sizes into (see instrumentation)
+    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+             num_nodes_expanded: number of nodes expanded by the search
+             max_frontier_size: maximum frontier size during search
+    """
+    stats.begin('alt_a_star_search')
+    heuristic = stats.timed('heuristic', table.heuristic)
+    instrumented = stats.enabled
+    source = problem.vertex_index(problem.init_state)
+    goal = problem.vertex_index(problem.goal_states[0])
+    if source < 0 or goal < 0:
+        stats.end()
+        return [], 0, 0
+    if source == goal:
+        stats.end()
+        return [problem.init_state], 0, 0
+    h = heuristic(np.array([source]), goal)[0]
+    if h == np.inf:
+        stats.end()
+        return [], 0, 0
+    offsets, indices = problem.offsets, problem.indices
+    frontier = [(h, 0, source)] # (f, -g, vertex), ties go to the deeper vertex
+    best_cost = {source: 0}
+    parent = {source: source}
+    closed = set()
+    max_frontier_size = 0
+    num_nodes_expanded = 0
+    num_nodes_generated = 0
+    num_pushes = 1
+    num_pops = 0
+    path = []
+
+    while frontier:
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        if instrumented:
+            stats.sample_frontier(num_nodes_expanded, len(frontier))
+        f, g, vertex = heapq.heappop(frontier)
+        num_pops += 1
+        if vertex in closed:
+            continue # stale entry of a vertex that was reached again more cheaply
+        if vertex == goal:
+            path = problem.vertex_ids[parent_path(parent, goal)].tolist()
+            break
+        closed.add(vertex)
+        num_nodes_expanded += 1
+        child_cost = -g + 1
+        num_nodes_generated += int(offsets[vertex + 1] - offsets[vertex])
+        children = [child for child in indices[offsets[vertex]:offsets[vertex + 1]].tolist()
+                    if child not in closed and child_cost < best_cost.get(child, np.inf)]
+        if not children:
+            continue
+        for child, child_h in zip(children, heuristic(np.array(children), goal).tolist()):
+            if child_h != np.inf:
+                best_cost[child] = child_cost
+                parent[child] = vertex
+                heapq.heappush(frontier, (child_cost + child_h, -child_cost, child))
+                num_pushes += 1
+
+    stats.end(expanded=num_nodes_expanded, generated=num_nodes_generated, heap_push=num_pushes, heap_pop=num_pops,
+              stale_pops=num_pops - num_nodes_expanded - (len(path) != 0))
+    return path, num_nodes_expanded, max_frontier_size
+
+
+def bidirectional_alt_search(problem, table, stats=NULL_STATS):
+    """
+    Bidirectional A* over the CSR adjacency of a GraphSearchProblem with the ALT heuristic. Both searches use the
+    average potential p(v) = (h(v, goal) - h(v, init)) / 2 (negated for the backward search), which keeps the two
+    searches consistent with each other, so the search can stop as soon as the two smallest keys add up to the length
+    of the best path found so far.
+
+    :param problem: instance of GraphSearchProblem
+    :param table: LandmarkTable of problem's graph
+    :param stats: SearchStats to report counters, phase times and frontier sizes into (see instrumentation)
+    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+             num_nodes_expanded: number of nodes expanded by both searches
+             max_frontier_size: maximum size of the two frontiers together
+    """
+    stats.begin('bidirectional_alt_search')
+    heuristic = stats.timed('heuristic', table.heuristic)
+    instrumented = stats.enabled
+    source = problem.vertex_index(problem.init_state)
+    goal = problem.vertex_index(problem.goal_states[0])
+    if source < 0 or goal < 0:
+        stats.end()
+        return [], 0, 0
+    if source == goal:
+        stats.end()
+        return [problem.init_state], 0, 0
+    if heuristic(np.array([source]), goal)[0] == np.inf:
+        stats.end()
+        return [], 0, 0
+    offsets, indices = problem.offsets, problem.indices
+
+    def potential(vertices):
+        return (heuristic(vertices, goal) - heuristic(vertices, source)) / 2
+
+    # every side: frontier of (key, -g, vertex), best g, parents, closed set and the sign of its potential
+    sides = [{'frontier': [(potential(np.array([source]))[0], 0, source)], 'cost': {source: 0},
+              'parent': {source: source}, 'closed': set(), 'sign': 1},
+             {'frontier': [(-potential(np.array([goal]))[0], 0, goal)], 'cost': {goal: 0}, 'parent': {goal: goal},
+              'closed': set(), 'sign': -1}]
+    best_length = np.inf
+    meeting = -1
+    max_frontier_size = 0
+    num_nodes_expanded = 0
+    num_nodes_generated = 0
+    num_pushes = 2
+    num_pops = 0
+
+    while sides[0]['frontier'] and sides[1]['frontier']:
+        max_frontier_size = max(max_frontier_size, len(sides[0]['frontier']) + len(sides[1]['frontier']))
+        if instrumented:
+            stats.sample_frontier(num_nodes_expanded, len(sides[0]['frontier']) + len(sides[1]['frontier']))
+        if sides[0]['frontier'][0][0] + sides[1]['frontier'][0][0] >= best_length:
+            break # no path through an open vertex can be shorter than the best one found
+        current = 0 if len(sides[0]['frontier']) <= len(sides[1]['frontier']) else 1
+        side, other = sides[current], sides[1 - current]
+        key, g, vertex = heapq.heappop(side['frontier'])
+        num_pops += 1
+        if vertex in side['closed']:
+            continue # stale entry of a vertex that was reached again more cheaply
+        side['closed'].add(vertex)
+        num_nodes_expanded += 1
+        child_cost = -g + 1
+        num_nodes_generated += int(offsets[vertex + 1] - offsets[vertex])
+        children = [child for child in indices[offsets[vertex]:offsets[vertex + 1]].tolist()
+                    if child not in side['closed'] and child_cost < side['cost'].get(child, np.inf)]
+        if not children:
+            continue
+        for child, child_potential in zip(children, potential(np.array(children)).tolist()):
+            side['cost'][child] = child_cost
+            side['parent'][child] = vertex
+            heapq.heappush(side['frontier'], (child_cost + side['sign'] * child_potential, -child_cost, child))
+            num_pushes += 1
+            if child in other['cost'] and child_cost + other['cost'][child] < best_length:
+                best_length = child_cost + other['cost'][child]
+                meeting = child
+
+    stats.end(expanded=num_nodes_expanded, generated=num_nodes_generated, heap_push=num_pushes, heap_pop=num_pops,
+              stale_pops=num_pops - num_nodes_expanded)
+    if meeting < 0:
+        return [], num_nodes_expanded, max_frontier_size
+    path = parent_path(sides[0]['parent'], meeting) + parent_path(sides[1]['parent'], meeting)[::-1][1:]
+    return problem.vertex_ids[path].tolist(), num_nodes_expanded, max_frontier_size
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+    from graph_loader import load_graph_problem
+    from bidirectional_search import bidirectional_search
+
+    problem = load_graph_problem('./stanford_large_network_facebook_combined.txt', [0], 0)
+    for strategy in ('farthest', 'avoid'):
+        start = time.time()
+        table = LandmarkTable.build(problem.offsets, problem.indices, k=16, strategy=strategy)
+        print("{:} landmarks: {:.2f} s, {:} kB table".format(strategy, time.time() - start,
+                                                               table.distances.nbytes // 1024))
+    with tempfile.TemporaryDirectory() as directory: # queries run on the memory-mapped copy of the table
+        table.save(directory)
+        table = LandmarkTable.load(directory)
+
+        rng = np.random.default_rng(1)
+        solvers = (('bidirectional', bidirectional_search), ('ALT A*', lambda query: alt_a_star_search(query, table)),
+                   ('bidirectional ALT', lambda query: bidirectional_alt_search(query, table)))
+        expanded = np.zeros(len(solvers))
+        times = np.zeros(len(solvers))
+        queries = 100
+        for query in range(queries):
+            init_state, goal_state = (int(vertex) for vertex in rng.choice(problem.vertex_ids, 2, replace=False))
+            query_problem = GraphSearchProblem.from_csr([goal_state], init_state, problem.vertex_ids,
+                                                        problem.offsets, problem.indices)
+            lengths = set()
+            for idx, (name, solver) in enumerate(solvers):
+                start = time.time()
+                path, num_nodes_expanded, max_frontier_size = solver(query_problem)
+                times[idx] += time.time() - start
+                expanded[idx] += num_nodes_expanded
+                assert query_problem.check_graph_solution(path)
+                lengths.add(len(path))
+            assert len(lengths) == 1
+        table = None # close the memory map before the directory is removed
+    for idx, (name, solver) in enumerate(solvers):
+        print("{:17}  average nodes expanded {:6.1f}, average time {:.4f} s".format(name, expanded[idx] / queries,
+                                                                                 times[idx] / queries))
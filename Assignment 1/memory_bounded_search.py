@@ -0,0 +1,303 @@
+import heapq
+import numpy as np
+from search_problems import GridSearchProblem, node_path
+from instrumentation import NULL_STATS
+
+
+def cell_successors(problem):
+    """
+    Successor function that reads the grid cells of a state's neighbours when it is called. The bounded searches never
+    use problem.neighbour_table, whose dense form costs 16 bytes per cell before the first expansion.
+
+    :param problem: an instance of GridSearchProblem
+    :return: function mapping a state to the list of states reachable from it in one move (+x, -x, +y, -y order)
+    """
+    M, N = problem.M, problem.N
+    overlay = problem.overlay # cells that differ from grid_map (shared, so set_cells is seen)
+    if hasattr(problem.grid_map, 'unpack_states'): # PackedGrid: read the bits, as PackedNeighbourTable does
+        bits = memoryview(np.asarray(problem.grid_map.bits))
+        cell = lambda state: bits[state >> 3] >> (state & 7) & 1
+    else:
+        grid_map = problem.grid_map
+        cell = lambda state: grid_map[state % M, state // M]
+
+    def successors(state):
+        x, y = state % M, state // M
+        children = []
+        for inside, child in ((x + 1 < M, state + 1), (x >= 1, state - 1), (y + 1 < N, state + M),
+                              (y >= 1, state - M)):
+            if inside:
+                occupied = overlay.get(child)
+                if not (cell(child) if occupied is None else occupied):
+                    children.append(child)
+        return children
+    return successors
+
+
+def ida_star_search(problem, max_nodes=100000, stats=NULL_STATS):
+    """
+    Iterative deepening A* (IDA*) for GridSearchProblem. Each iteration is a depth-first search that cuts off every
+    path whose f = g + manhattan_heuristic exceeds the current threshold; the next threshold is the smallest f that was
+    cut off. Besides the current path (states already on it are skipped), whatever is left of the memory cap holds a
+    transposition table of the cheapest g at which each state was expanded in this iteration, so that the many
+    equivalent paths of a grid are not searched again. Once the table is full no more states are added to it (and
+    entries are dropped as the path grows): memory stays bounded and the search only gets slower.
+
+    :param problem: an instance of GridSearchProblem to solve
+    :param max_nodes: memory cap on the number of nodes held by the current path and the transposition table. Paths
+                      longer than max_nodes states are cut off, so no such solution can be found.
+    :param stats: SearchStats to report counters, phase times and resident node counts into (see instrumentation); the
+                  heuristic is computed inline, so it has no timer of its own
+    :return: path: a list of states (ints) from problem.init_state to problem.goal_states[0] ([] if none was found)
+             num_nodes_expanded: number of nodes expanded over all iterations
+             peak_resident_nodes: largest number of nodes held in memory at once
+    """
+    goal_state = problem.goal_states[0]
+    state = problem.init_state
+    M = problem.M
+    goal_x, goal_y = goal_state % M, goal_state // M
+    successors = cell_successors(problem)
+    threshold = problem.manhattan_heuristic(state, goal_state)
+    num_nodes_expanded = 0
+    peak_resident_nodes = 1
+    stats.begin('ida_star_search')
+    instrumented = stats.enabled
+    num_nodes_generated = 0
+    num_iterations = 0
+    try:
+        while True:
+            num_iterations += 1
+            path = [state]
+            on_path = {state}
+            pending = [None] # children of every node on the path that are still to be tried
+            best_g = {} # transposition table: state -> smallest g it was expanded at in this iteration
+            next_threshold = float('inf')
+            while path:
+                node = path[-1]
+                children = pending[-1]
+                if children is None: # first visit of node in this iteration
+                    f = len(path) - 1 + abs(node % M - goal_x) + abs(node // M - goal_y)
+                    if f > threshold:
+                        next_threshold = min(next_threshold, f)
+                        children = []
+                    elif node == goal_state:
+                        return path, num_nodes_expanded, peak_resident_nodes
+                    elif len(path) == max_nodes:
+                        children = [] # the memory cap cuts this path off
+                    elif best_g.get(node, max_nodes) <= len(path) - 1:
+                        children = [] # already searched from this state with at least as much of the threshold left
+                    else:
+                        if node in best_g or len(path) + len(best_g) < max_nodes:
+                            best_g[node] = len(path) - 1
+                        num_nodes_expanded += 1
+                        children = [child for child in successors(node) if child not in on_path]
+                        num_nodes_generated += len(children)
+                        if instrumented:
+                            stats.sample_frontier(num_nodes_expanded, len(path) + len(best_g))
+                        # try the children closest to the goal first
+                        children.sort(key=lambda child: -abs(child % M - goal_x) - abs(child // M - goal_y))
+                    pending[-1] = children
+                if children:
+                    child = children.pop()
+                    path.append(child)
+                    on_path.add(child)
+                    pending.append(None)
+                    if len(path) + len(best_g) > max_nodes:
+                        best_g.popitem() # the table only prunes, any entry can go to make room for the path
+                    peak_resident_nodes = max(peak_resident_nodes, len(path) + len(best_g))
+                else:
+                    on_path.discard(path.pop())
+                    pending.pop()
+            if next_threshold == float('inf'):
+                return [], num_nodes_expanded, peak_resident_nodes # nothing was cut off by f: no solution
+            threshold = next_threshold
+    finally:
+        stats.end(expanded=num_nodes_expanded, generated=num_nodes_generated, iterations=num_iterations,
+                  peak_resident=peak_resident_nodes)
+
+
+class MemoryNode:
+    __slots__ = ('parent', 'state', 'g', 'f', 'depth', 'children', 'forgotten', 'expanded', 'resident')
+
+    def __init__(self, parent, state, g, f, depth):
+        self.parent = parent
+        self.state = state
+        self.g = g
+        self.f = f
+        self.depth = depth
+        self.children = {} # state -> MemoryNode of the children held in memory
+        self.forgotten = {} # state -> f of the children that are not held in memory (dropped or never stored)
+        self.expanded = False
+        self.resident = True
+
+    def key(self):
+        # f of the most promising path that can still be regenerated from this node: its own f before it is expanded,
+        # then the best f among its forgotten children (inf when there is none)
+        if not self.expanded:
+            return self.f
+        return min(self.forgotten.values()) if self.forgotten else float('inf')
+
+
+def sma_star_search(problem, max_nodes=100000, stats=NULL_STATS):
+    """
+    Simplified memory-bounded A* (SMA*) for GridSearchProblem. It runs like A* until the node budget is used up; then,
+    to make room, it drops the leaf with the highest f (the shallowest among ties) and remembers that f in its parent.
+    A node whose children are not all in memory stays in the open list, keyed by the best f it forgot, and when it is
+    chosen again only those children are regenerated. Children that do not fit in the budget are forgotten right away,
+    most promising ones kept first, so the search needs room for one path and one child at a time. A state is kept in
+    memory at most once: a new path to a resident state is skipped unless it is cheaper, in which case the old subtree
+    is dropped. A child whose f is at least max_nodes is a dead end from the start, as no path through it fits in the
+    budget.
+
+    With the Manhattan heuristic (consistent on the grid) the result is optimal whenever max_nodes is at least the
+    number of states on an optimal path; with less memory no path is returned.
+
+    :param problem: an instance of GridSearchProblem to solve
+    :param max_nodes: node budget: the number of nodes held in memory never exceeds it
+    :param stats: SearchStats to report counters, phase times and resident node counts into (see instrumentation); the
+                  heuristic is computed inline, so it has no timer of its own
+    :return: path: a list of states (ints) from problem.init_state to problem.goal_states[0] ([] if none was found)
+             num_nodes_expanded: number of nodes expanded (regenerations of forgotten children included)
+             peak_resident_nodes: largest number of nodes held in memory at once
+    """
+    goal_state = problem.goal_states[0]
+    M = problem.M
+    goal_x, goal_y = goal_state % M, goal_state // M
+    successors = cell_successors(problem)
+    root = MemoryNode(None, problem.init_state, 0, problem.manhattan_heuristic(problem.init_state, goal_state), 0)
+    resident = {root.state: root}
+    open_nodes = [] # (key, -depth, order, node): most promising node first
+    leaves = [] # (-key, depth, order, node): childless node to drop first
+    order = 0 # insertion counter, breaks ties without comparing nodes
+    num_nodes_expanded = 0
+    peak_resident_nodes = 1
+    stats.begin('sma_star_search')
+    instrumented = stats.enabled
+    num_nodes_regenerated = 0
+    num_nodes_generated = 0
+    num_nodes_dropped = 0
+    num_pushes = 0
+    num_pops = 0
+
+    def push(node):
+        # (Re)inserts node with its current key; heap entries are never removed, they go stale when the key changes
+        nonlocal order, num_pushes
+        order += 1
+        num_pushes += 1
+        key = node.key()
+        heapq.heappush(open_nodes, (key, -node.depth, order, node))
+        if not node.children:
+            heapq.heappush(leaves, (-key, node.depth, order, node))
+
+    def drop(node):
+        # Removes a node and all its descendants from memory
+        nonlocal num_nodes_dropped
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            num_nodes_dropped += 1
+            current.resident = False
+            del resident[current.state]
+            stack.extend(current.children.values())
+        del node.parent.children[node.state]
+
+    def make_room(needed, keep):
+        # Drops the worst leaves (never keep, which is being expanded) until needed more nodes fit in the budget
+        while len(resident) + needed > max_nodes and leaves:
+            neg_key, depth, _, leaf = heapq.heappop(leaves)
+            if leaf is keep or not leaf.resident or leaf.children or leaf.key() != -neg_key:
+                continue # stale entry (keep gets children or a new entry right after)
+            parent = leaf.parent
+            if parent is None:
+                continue # the root is never dropped
+            drop(leaf)
+            if neg_key != float('-inf'): # nothing is left to find below a dead end
+                parent.forgotten[leaf.state] = -neg_key
+            push(parent)
+
+    push(root)
+    path = []
+    while open_nodes:
+        f, depth, _, node = heapq.heappop(open_nodes)
+        num_pops += 1
+        if not node.resident or node.key() != f:
+            continue # stale entry
+        if f == float('inf'):
+            break # every open node is a dead end
+        if not node.expanded and node.state == goal_state:
+            path = node_path(node)
+            break
+
+        if node.expanded: # regenerate the forgotten children
+            num_nodes_regenerated += 1
+            candidates = list(node.forgotten.items())
+            node.forgotten = {}
+        else:
+            candidates = []
+            for child_state in successors(node.state):
+                child_f = node.g + 1 + abs(child_state % M - goal_x) + abs(child_state // M - goal_y)
+                if child_f >= max_nodes:
+                    child_f = float('inf') # every path through it has more than max_nodes states: it can never fit
+                candidates.append((child_state, child_f))
+            node.expanded = True
+        num_nodes_expanded += 1
+        num_nodes_generated += len(candidates)
+        if instrumented:
+            stats.sample_frontier(num_nodes_expanded, len(resident))
+
+        children = []
+        g = node.g + 1
+        for child_state, child_f in candidates:
+            other = resident.get(child_state)
+            if other is not None:
+                if other.g <= g:
+                    continue # the state is already held with a path at least as cheap
+                parent = other.parent
+                drop(other)
+                push(parent)
+            children.append((child_f, child_state))
+
+        make_room(len(children), node)
+        children.sort()
+        room = max_nodes - len(resident)
+        if room <= 0 and children:
+            break # not even the path to this node and one child fit in the budget
+        for child_f, child_state in children[room:]:
+            node.forgotten[child_state] = child_f # kept for later, most promising children first in memory
+        for child_f, child_state in children[:room]:
+            child = MemoryNode(node, child_state, g, child_f, node.depth + 1)
+            node.children[child_state] = child
+            resident[child_state] = child
+            push(child)
+        push(node)
+        peak_resident_nodes = max(peak_resident_nodes, len(resident))
+
+    stats.end(expanded=num_nodes_expanded, regenerated=num_nodes_regenerated, generated=num_nodes_generated,
+              dropped=num_nodes_dropped, heap_push=num_pushes, heap_pop=num_pops, peak_resident=peak_resident_nodes)
+    return path, num_nodes_expanded, peak_resident_nodes
+
+
+if __name__ == '__main__':
+    import time
+    from a_star_search import a_star_search
+
+    # Goal a short distance away on a large grid: A* holds its whole explored region, the bounded searches do not
+    np.random.seed(0)
+    M = 2000
+    N = 2000
+    grid_map = np.random.rand(M, N) <= 0.2
+    init_state = (N // 2) * M + M // 2
+    goal_state = init_state + 150 * M + 150
+    problem = GridSearchProblem([goal_state], init_state, M, N, grid_map)
+
+    start = time.time()
+    path, num_nodes_expanded, max_frontier_size = a_star_search(problem)
+    print("A*:           path length {:}, {:8} nodes expanded, {:.2f} s".format(len(path), num_nodes_expanded,
+                                                                                time.time() - start))
+    for name, solver, max_nodes in (('IDA* (5000)', ida_star_search, 5000), ('SMA* (2000)', sma_star_search, 2000),
+                                    ('SMA* (500)', sma_star_search, 500)):
+        start = time.time()
+        bounded_path, num_nodes_expanded, peak_resident_nodes = solver(problem, max_nodes)
+        assert not bounded_path or problem.check_solution(bounded_path)
+        print("{:13} path length {:}, {:8} nodes expanded, {:5} peak resident nodes, {:.2f} s".format(
+            name + ':', len(bounded_path), num_nodes_expanded, peak_resident_nodes, time.time() - start))
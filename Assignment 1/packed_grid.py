@@ -0,0 +1,118 @@
+import json
+import numpy as np
+
+
+class PackedGrid:
+    """
+    MxN occupancy grid stored one bit per cell (np.packbits, little bit order) in state order: cell (x, y) is bit
+    y*M + x, so bit s & 7 of byte s >> 3 tells whether state s is occupied. Indexing with [x, y] works like on a bool
+    grid_map, for single cells or numpy arrays of coordinates, so a PackedGrid can be given to GridSearchProblem in place
+    of a bool array at an eighth of the memory.
+    """
+    def __init__(self, bits, M, N):
+        self.bits = bits # uint8 array of ceil(M*N / 8) bytes (may be read-only or memory-mapped)
+        self.M = M
+        self.N = N
+        self.shape = (M, N)
+
+    @classmethod
+    def from_bool(cls, grid_map):
+        # Packs a bool grid_map indexed [x, y]
+        M, N = grid_map.shape
+        return cls(np.packbits(grid_map.ravel(order='F'), bitorder='little'), M, N)
+
+    @classmethod
+    def random(cls, p_occ, M, N, rows_per_chunk=1024):
+        """
+        Random grid where each cell is occupied with probability p_occ, generated a band of rows at a time so that no
+        full byte-per-cell array is ever allocated.
+
+        :param rows_per_chunk: number of grid rows (y values) generated at once, rounded up to fill whole bytes
+        """
+        bits = np.zeros(-(-M * N // 8), dtype=np.uint8)
+        unit = 8 // int(np.gcd(M, 8)) # smallest number of rows that fills whole bytes
+        step = -(-rows_per_chunk // unit) * unit
+        for start in range(0, N, step):
+            cells = np.random.rand(min(step, N - start) * M) <= p_occ
+            packed = np.packbits(cells, bitorder='little')
+            bits[start * M // 8:start * M // 8 + len(packed)] = packed
+        return cls(bits, M, N)
+
+    def save(self, path):
+        # Writes the bits as a .npy file at path and the grid size next to it (path + '.json')
+        with open(path, 'wb') as bits_file:
+            np.save(bits_file, self.bits)
+        with open(path + '.json', 'w') as meta_file:
+            json.dump({'M': self.M, 'N': self.N}, meta_file)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        # Grid saved with save(); by default the bits are memory-mapped read-only instead of read into memory
+        with open(path + '.json') as meta_file:
+            meta = json.load(meta_file)
+        return cls(np.load(path, mmap_mode=mmap_mode), meta['M'], meta['N'])
+
+    def __getitem__(self, index):
+        x, y = index
+        return self.test(y * self.M + x)
+
+    def test(self, states):
+        # Occupancy of one state (returns a bool) or of a numpy array of states (returns a bool array)
+        if np.ndim(states) == 0:
+            return bool(self.bits[states >> 3] >> (states & 7) & 1)
+        states = np.asarray(states)
+        return (self.bits[states >> 3] >> (states & 7).astype(np.uint8) & 1).astype(bool)
+
+    def set(self, state, occupied):
+        if occupied:
+            self.bits[state >> 3] |= 1 << (state & 7)
+        else:
+            self.bits[state >> 3] &= ~(1 << (state & 7)) & 0xff
+
+    def unpack_states(self):
+        # bool array with the occupancy of every state, in state order
+        return np.unpackbits(self.bits, count=self.M * self.N, bitorder='little').view(bool)
+
+    def unpack(self):
+        # bool grid_map indexed [x, y]
+        return self.unpack_states().reshape(self.N, self.M).T
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import time
+    import tracemalloc
+    from search_problems import GridSearchProblem
+    from a_star_search import a_star_search
+
+    np.random.seed(0)
+    M = 10000
+    N = 10000
+    start = time.time()
+    grid = PackedGrid.random(0.2, M, N)
+    print("Random {:}x{:} grid: {:.2f} s, {:.1f} MB packed ({:.1f} MB as a bool array)".format(
+        M, N, time.time() - start, grid.bits.nbytes / 1e6, M * N / 1e6))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'map.npy')
+        grid.save(path)
+        start = time.time()
+        mapped = PackedGrid.load(path)
+        print("Memory-mapped load: {:.4f} s".format(time.time() - start))
+        states = np.random.randint(M * N, size=1000000)
+        start = time.time()
+        assert np.array_equal(mapped.test(states), grid.test(states))
+        print("1e6 cell tests: {:.3f} s".format(time.time() - start))
+
+        # a problem over the whole mapped grid: neither the map nor a successor table is expanded in memory
+        tracemalloc.start()
+        start = time.time()
+        problem = GridSearchProblem([5600 * M + 5400], 5000 * M + 5000, M, N, mapped)
+        path, num_nodes_expanded, max_frontier_size = a_star_search(problem)
+        elapsed = time.time() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("A* on the full {:}x{:} mapped grid: path length {:}, valid {:}, {:} nodes expanded, {:.2f} s, "
+              "{:.1f} MB peak allocated".format(M, N, len(path), problem.check_solution(path), num_nodes_expanded,
+                                                elapsed, peak / 1e6))
+        problem = mapped = None # close the memory map before the directory is removed
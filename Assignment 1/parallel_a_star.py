@@ -0,0 +1,248 @@
+import heapq
+import queue
+import time
+from multiprocessing import Array, Event, Process, Queue, Value
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from search_problems import GridSearchProblem, get_random_grid_problem, parent_path
+from instrumentation import NULL_STATS
+
+NO_COST = 2**31 - 1 # g of states that were never reached (and the incumbent before a solution is found)
+
+
+def owner(state, processes):
+    # Worker that owns a state: a multiplicative hash spreads neighbouring cells over all workers
+    return (state * 2654435761 >> 12) % processes
+
+
+def hda_star_search(problem, processes=4, batch_size=256, stats=NULL_STATS):
+    """
+    Hash-distributed A* (HDA*) over several processes. Every state is owned by the worker that owner(state) picks:
+    only that worker keeps it in its open list and writes its g and parent. Children generated for another worker are
+    buffered and sent to its inbox in batches. The grid and the g and parent arrays live in shared memory, so workers
+    attach to them instead of receiving copies, and the path is read from the parent array at the end.
+
+    A worker only expands states with f below the incumbent (the best goal cost found so far). The search ends when
+    every worker is idle and no batch is in flight, which is detected by comparing the sent and received batch
+    counters of all workers over two consecutive checks; by then no state with f below the incumbent remains, so the
+    incumbent is optimal.
+
+    :param problem: an instance of GridSearchProblem to solve
+    :param processes: number of worker processes
+    :param batch_size: number of children buffered for a worker before they are sent (and number of states expanded
+                       between two checks of the inbox)
+    :param stats: SearchStats to report the workers' counters and the phase times of this process into (see
+                  instrumentation); the workers run on their own, so the frontier is not sampled
+    :return: path: a list of states (ints) from problem.init_state to problem.goal_states[0] ([] if there is none)
+             num_nodes_expanded: number of nodes expanded by all workers (states can be expanded again by their owner
+                                 when a cheaper path reaches them later)
+             max_frontier_size: sum of the largest open list size of every worker
+    """
+    stats.begin('hda_star_search')
+    problem = stats.wrap(problem)
+    goal_state = problem.goal_states[0]
+    state = problem.init_state
+    if goal_state == state:
+        stats.end()
+        return [state], 0, 0
+    num_states = problem.M * problem.N
+    blocks = [SharedMemory(create=True, size=num_states), SharedMemory(create=True, size=4 * num_states),
+              SharedMemory(create=True, size=4 * num_states)]
+    num_nodes_expanded = 0
+    max_frontier_size = 0
+    num_batches = 0
+    try:
+        np.ndarray(num_states, dtype=np.bool_, buffer=blocks[0].buf)[:] = problem.blocked_states()
+        g = np.ndarray(num_states, dtype=np.int32, buffer=blocks[1].buf)
+        g[:] = NO_COST
+        g[state] = 0
+        parent = np.ndarray(num_states, dtype=np.int32, buffer=blocks[2].buf)
+        parent[:] = -1
+
+        inboxes = [Queue() for rank in range(processes)]
+        results = Queue()
+        incumbent = Value('i', NO_COST)
+        counters = Array('q', 3 * processes, lock=False) # batches sent, batches received, idle flag of every worker
+        done = Event()
+        workers = [Process(target=hda_worker, args=(rank, [block.name for block in blocks], problem.M, problem.N,
+                                                    state, goal_state, inboxes, incumbent, counters, done, results,
+                                                    batch_size))
+                   for rank in range(processes)]
+        for worker in workers:
+            worker.start()
+
+        def check_workers():
+            # A worker that died never sets its idle flag nor reports, so waiting for it would hang
+            failed = [worker.exitcode for worker in workers if worker.exitcode not in (None, 0)]
+            if failed:
+                done.set()
+                for worker in workers:
+                    worker.terminate()
+                for worker in workers:
+                    worker.join()
+                raise RuntimeError("an HDA* worker exited with code {:}".format(failed[0]))
+
+        previous = None
+        while True: # termination detection
+            time.sleep(0.001)
+            check_workers()
+            if not all(counters[2 * processes:]):
+                previous = None
+                continue
+            snapshot = (sum(counters[processes:2 * processes]), sum(counters[:processes]))
+            if snapshot[0] == snapshot[1] and snapshot == previous:
+                break # everybody idle and every batch received, twice in a row with no batch in between
+            previous = snapshot
+        done.set()
+        num_batches = sum(counters[:processes])
+        for rank in range(processes):
+            while True:
+                try:
+                    expanded, frontier = results.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    check_workers()
+            num_nodes_expanded += expanded
+            max_frontier_size += frontier
+        for worker in workers:
+            worker.join()
+
+        path = parent_path(parent, goal_state) if incumbent.value != NO_COST else []
+        del g, parent # release the buffers before closing the shared memory
+        return path, num_nodes_expanded, max_frontier_size
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        stats.end(expanded=num_nodes_expanded, batches=num_batches, processes=processes,
+                  max_frontier=max_frontier_size)
+
+
+def hda_worker(rank, names, M, N, init_state, goal_state, inboxes, incumbent, counters, done, results, batch_size):
+    """
+    Search loop of one HDA* worker: receive batches of (state, g, parent) for the states it owns, expand its cheapest
+    open states, and send the children it does not own to their owners.
+    """
+    blocks = [SharedMemory(name=name) for name in names]
+    blocked = blocks[0].buf
+    best_g = blocks[1].buf.cast('i')
+    parent = blocks[2].buf.cast('i')
+    processes = len(inboxes)
+    inbox = inboxes[rank]
+    goal_x, goal_y = goal_state % M, goal_state // M
+    open_list = [] # (f, -g, state), stale entries are skipped when popped
+    outboxes = [[] for worker in range(processes)]
+    sent = 0
+    received = 0
+    num_nodes_expanded = 0
+    max_frontier_size = 0
+    if owner(init_state, processes) == rank:
+        open_list.append((abs(init_state % M - goal_x) + abs(init_state // M - goal_y), 0, init_state))
+
+    def accept(batch):
+        # Keeps the states of a batch that improve on their best known g
+        for state, g, state_parent in batch:
+            if g < best_g[state]:
+                best_g[state] = g
+                parent[state] = state_parent
+                if state == goal_state:
+                    with incumbent.get_lock():
+                        if g < incumbent.value:
+                            incumbent.value = g
+                else:
+                    heapq.heappush(open_list, (g + abs(state % M - goal_x) + abs(state // M - goal_y), -g, state))
+
+    def send(worker):
+        nonlocal sent
+        sent += 1
+        counters[worker_sent] = sent # counted before the put, so a batch in flight always shows up in the totals
+        inboxes[worker].put(outboxes[worker])
+        outboxes[worker] = []
+
+    worker_sent, worker_received, worker_idle = rank, processes + rank, 2 * processes + rank
+    while not done.is_set():
+        while True: # drain the inbox
+            try:
+                batch = inbox.get_nowait()
+            except queue.Empty:
+                break
+            counters[worker_idle] = 0
+            received += 1
+            counters[worker_received] = received
+            accept(batch)
+
+        bound = incumbent.value
+        expanded = 0
+        while open_list and expanded < batch_size:
+            f, g, state = heapq.heappop(open_list)
+            g = -g
+            if g > best_g[state]:
+                continue # a cheaper path to this state was found after this entry was pushed
+            if f >= bound:
+                open_list = [] # nothing left here can beat the incumbent
+                break
+            expanded += 1
+            child_g = g + 1
+            x, y = state % M, state // M
+            for child in (state + 1 if x + 1 < M else -1, state - 1 if x > 0 else -1,
+                          state + M if y + 1 < N else -1, state - M if y > 0 else -1):
+                if child < 0 or blocked[child] or child_g >= best_g[child]: # g only ever goes down, a stale read is safe
+                    continue
+                if child_g + abs(child % M - goal_x) + abs(child // M - goal_y) >= bound:
+                    continue
+                child_owner = owner(child, processes)
+                if child_owner == rank:
+                    accept(((child, child_g, state),))
+                else:
+                    outboxes[child_owner].append((child, child_g, state))
+                    if len(outboxes[child_owner]) >= batch_size:
+                        send(child_owner)
+        num_nodes_expanded += expanded
+        max_frontier_size = max(max_frontier_size, len(open_list))
+
+        if expanded == 0: # out of work: flush everything, then wait for the next batch
+            for worker in range(processes):
+                if outboxes[worker]:
+                    send(worker)
+            counters[worker_idle] = 1
+            try:
+                batch = inbox.get(timeout=0.005)
+            except queue.Empty:
+                continue
+            counters[worker_idle] = 0
+            received += 1
+            counters[worker_received] = received
+            accept(batch)
+        else: # keep the other workers busy even if the buffers are not full yet
+            for worker in range(processes):
+                if outboxes[worker]:
+                    send(worker)
+
+    results.put((num_nodes_expanded, max_frontier_size))
+    del blocked, best_g, parent
+    for block in blocks:
+        block.close()
+
+
+if __name__ == '__main__':
+    import os
+    from a_star_search import a_star_search
+
+    # Speedup against the number of workers on 2000x2000 grids
+    np.random.seed(0)
+    M = 2000
+    N = 2000
+    problem = get_random_grid_problem(0.2, M, N)
+    problem = GridSearchProblem([M * N - 1], 0, M, N, problem.grid_map) # corner to corner
+    start = time.time()
+    path, num_nodes_expanded, max_frontier_size = a_star_search(problem)
+    serial_time = time.time() - start
+    print("a_star_search: path length {:}, {:.2f} s ({:} CPUs available)".format(len(path), serial_time,
+                                                                                 os.cpu_count()))
+    for processes in (1, 2, 4, 8):
+        start = time.time()
+        hda_path, num_nodes_expanded, max_frontier_size = hda_star_search(problem, processes)
+        hda_time = time.time() - start
+        assert len(hda_path) == len(path) and (not path or problem.check_solution(hda_path))
+        print("HDA* with {:} workers: {:8} nodes expanded, {:.2f} s, speedup {:.2f}".format(
+            processes, num_nodes_expanded, hda_time, serial_time / hda_time))
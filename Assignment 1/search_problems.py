@@ -1,9 +1,12 @@
 from abc import ABC, abstractmethod
+from collections.abc import Mapping
 import numpy as np
 from matplotlib import pyplot as plt
+from packed_grid import PackedGrid
 
 
 class Node:
+    __slots__ = ('parent', 'state', 'action', 'path_cost') # no per-instance __dict__: searches create one per child
 
     def __init__(self, parent, state, action, path_cost):
         self.parent = parent
@@ -27,6 +30,16 @@ class SearchProblem(ABC):
         self.init_state = init_state
         super().__init__()
 
+    @property
+    def goal_states(self):
+        return self._goal_states
+
+    @goal_states.setter
+    def goal_states(self, goal_states):
+        # goal_set mirrors goal_states for constant-time goal tests, and is rebuilt whenever the goals are replaced
+        self._goal_states = goal_states
+        self.goal_set = frozenset(goal_states)
+
     @abstractmethod
     def get_child_node(self, parent_node, action):
         pass
@@ -50,13 +63,7 @@ class SearchProblem(ABC):
     def trace_path(self, node, target_state=None):
         if target_state == None:
             target_state = self.init_state
-        path = [node.state]
-        node_current = node
-        while node_current.state != target_state:
-            node_current = node_current.parent
-            path.append(node_current.state)
-        path.reverse()
-        return path
+        return node_path(node, target_state)
 
 
 class SimpleSearchProblem(SearchProblem):
@@ -81,7 +88,7 @@ class SimpleSearchProblem(SearchProblem):
             return action[0]
 
     def goal_test(self, state):
-        return self.goal_states.__contains__(state)
+        return state in self.goal_set
 
     def action_cost(self, start_state, action, end_state):
         return 1
@@ -94,6 +101,10 @@ class SimpleSearchProblem(SearchProblem):
 class GraphSearchProblem(SimpleSearchProblem):
     """
     Search problems given over an explicit graph with named vertices and unit edge costs.
+
+    The adjacency is stored in compressed-sparse-row (CSR) form: the neighbours of the vertex with dense index i are
+    indices[offsets[i]:offsets[i+1]], sorted so that membership tests are a binary search. Dense indices refer to
+    positions in vertex_ids (the sorted unique vertex identifiers).
     """
     def __init__(self, goal_states, init_state, V, E):
         super(GraphSearchProblem, self).__init__(goal_states, init_state)
@@ -104,20 +115,60 @@ class GraphSearchProblem(SimpleSearchProblem):
             self.E = E
         else:
             self.E = E[:, 0:2]
-        # Construct neighbour dictionary
-        self.neighbours = {}
-        for vertex in self.V:
-            self.neighbours[vertex] = []
-        for idx in range(self.E.shape[0]):
-            edge = self.E[idx]
-            self.neighbours[edge[0]].append(edge[1])
-            self.neighbours[edge[1]].append(edge[0])
+        # Construct the CSR adjacency in one vectorized pass over the edge list
+        self.vertex_ids = np.unique(V)
+        edges = np.searchsorted(self.vertex_ids, self.E)
+        if self.E.size and (edges.max() >= len(self.vertex_ids) or np.any(self.vertex_ids[edges] != self.E)):
+            raise KeyError("Edge list E contains vertices that are not in V")
+        self.offsets, self.indices = build_csr(len(self.vertex_ids), edges[:, 0], edges[:, 1])
+        self._neighbours = None
+
+    @classmethod
+    def from_csr(cls, goal_states, init_state, vertex_ids, offsets, indices):
+        """
+        Makes a GraphSearchProblem around an already built CSR adjacency (see build_csr) without touching an edge list,
+        so many problems can share one loaded graph. The arrays are used as-is (they may be read-only or memory-mapped)
+        and E is left as None.
+        """
+        problem = cls.__new__(cls)
+        SimpleSearchProblem.__init__(problem, goal_states, init_state)
+        problem.V = vertex_ids
+        problem.E = None
+        problem.vertex_ids = vertex_ids
+        problem.offsets = offsets
+        problem.indices = indices
+        problem._neighbours = None
+        return problem
+
+    @property
+    def neighbours(self):
+        # Dictionary-of-lists view of the adjacency, only built row by row when it is accessed
+        if self._neighbours is None:
+            self._neighbours = NeighbourView(self)
+        return self._neighbours
+
+    def vertex_index(self, state):
+        # Dense index of a vertex identifier, or -1 if the vertex is not in the graph
+        idx = int(np.searchsorted(self.vertex_ids, state))
+        if idx < len(self.vertex_ids) and self.vertex_ids[idx] == state:
+            return idx
+        return -1
 
     def get_actions(self, state):
-        return [(state, edge) for edge in self.neighbours[state]]
+        idx = self.vertex_index(state)
+        if idx < 0:
+            raise KeyError(state)
+        row = self.indices[self.offsets[idx]:self.offsets[idx+1]]
+        return [(state, edge) for edge in self.vertex_ids[row].tolist()]
 
     def is_neighbour(self, state1, state2):
-        return self.neighbours[state1].__contains__(state2)
+        idx1 = self.vertex_index(state1)
+        idx2 = self.vertex_index(state2)
+        if idx1 < 0 or idx2 < 0:
+            return False
+        row = self.indices[self.offsets[idx1]:self.offsets[idx1+1]]
+        pos = np.searchsorted(row, idx2)  # rows are sorted, so this is a binary search
+        return bool(pos < len(row) and row[pos] == idx2)
 
     def check_graph_solution(self, path):
         if not path:
@@ -127,7 +178,7 @@ class GraphSearchProblem(SimpleSearchProblem):
                 if state != self.init_state:
                     return False
             if idx == len(path)-1:
-                if not self.goal_states.__contains__(state):
+                if not self.goal_test(state):
                     return False
             else:
                 if not self.is_neighbour(state, path[idx+1]):
@@ -135,57 +186,299 @@ class GraphSearchProblem(SimpleSearchProblem):
         return True
 
 
+class NeighbourView(Mapping):
+    """
+    Read-only dictionary-of-lists view over the CSR adjacency of a GraphSearchProblem, matching the old
+    GraphSearchProblem.neighbours dictionary (vertex -> list of neighbouring vertices).
+    """
+    def __init__(self, problem):
+        self.problem = problem
+
+    def __getitem__(self, state):
+        idx = self.problem.vertex_index(state)
+        if idx < 0:
+            raise KeyError(state)
+        row = self.problem.indices[self.problem.offsets[idx]:self.problem.offsets[idx+1]]
+        return self.problem.vertex_ids[row].tolist()
+
+    def __iter__(self):
+        return iter(self.problem.vertex_ids.tolist())
+
+    def __len__(self):
+        return len(self.problem.vertex_ids)
+
+
+def build_csr(num_vertices, sources, targets):
+    """
+    Builds an undirected CSR adjacency from an edge list given as dense vertex indices. Every edge is stored in both
+    directions and each row of indices is sorted.
+
+    :param num_vertices: number of vertices (dense indices are 0 <= i < num_vertices)
+    :param sources: numpy array of the first endpoint of each edge
+    :param targets: numpy array of the second endpoint of each edge
+    :return: offsets: numpy int64 array of shape (num_vertices+1,)
+             indices: numpy int32 (or int64 for very large graphs) array of neighbour indices
+    """
+    index_type = np.int32 if num_vertices < np.iinfo(np.int32).max else np.int64
+    src = np.concatenate((sources, targets)).astype(index_type, copy=False)
+    dst = np.concatenate((targets, sources)).astype(index_type, copy=False)
+    order = np.lexsort((dst, src))
+    offsets = np.zeros(num_vertices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_vertices), out=offsets[1:])
+    return offsets, dst[order]
+
+
+def gather_neighbours(offsets, indices, frontier):
+    """
+    Gathers the CSR rows of every vertex in a frontier at once.
+
+    :param offsets: CSR row offsets (see build_csr)
+    :param indices: CSR neighbour indices (see build_csr)
+    :param frontier: numpy array of dense vertex indices
+    :return: positions: numpy array giving, for each gathered neighbour, the position in frontier it was reached from
+             neighbours: numpy array of the gathered neighbour indices, row by row in frontier order
+    """
+    starts = offsets[frontier]
+    counts = offsets[frontier + 1] - starts
+    positions = np.repeat(np.arange(len(frontier)), counts)
+    row_starts = np.cumsum(counts) - counts
+    edges = np.arange(positions.shape[0]) - row_starts[positions] + starts[positions]
+    return positions, indices[edges]
+
+
+def node_path(node, target_state=None):
+    """
+    Path of states from target_state (or the root of the search tree) down to node, following Node.parent links. The
+    states are appended and reversed once, so the cost is linear in the path length.
+
+    :param node: last Node of the path
+    :param target_state: state at which to stop (None follows the parents up to the root)
+    :return: list of states
+    """
+    path = [node.state]
+    while node.state != target_state and node.parent is not None:
+        node = node.parent
+        path.append(node.state)
+    path.reverse()
+    return path
+
+
+def parent_path(parent, node):
+    """
+    Path from the root of a search tree stored as a flat parent array (parent[state] is the state it was reached from)
+    down to node. The root is either its own parent or has a negative parent.
+
+    :param parent: sequence of parent states indexed by state (list, array or numpy array)
+    :param node: last state of the path
+    :return: list of states (python ints)
+    """
+    path = [int(node)]
+    while True:
+        previous = int(parent[path[-1]])
+        if previous < 0 or previous == path[-1]:
+            break
+        path.append(previous)
+    path.reverse()
+    return path
+
+
 class GridSearchProblem(SimpleSearchProblem):
+    """
+    Search problems over an MxN 4-connected occupancy grid (grid_map[x, y] is True for occupied cells). Cell (x, y) is
+    the state y*M + x.
+
+    grid_map is either a bool numpy array or a PackedGrid, and is never written to: it is kept as a read-only view (so
+    it can be memory-mapped or shared between problems), and the cells that differ from it, such as the cleared initial
+    and goal states and the changes made with set_cells, are kept in a small overlay. Use is_blocked, occupancy and
+    blocked_states to read the occupancy with the overlay applied.
+
+    The successors of every state are read from neighbour_table, indexed by state (or by a numpy array of states) and
+    giving the states reached by moving +x, -x, +y and -y (-1 where the move leaves the grid or enters an occupied
+    cell). Over a bool grid_map it is an int32 array of shape (M*N, 4), built on first use; over a PackedGrid it is a
+    PackedNeighbourTable that computes the rows from the bits and the overlay when they are read, so that a packed or
+    memory-mapped map is never expanded to a byte (or 16 bytes) per cell. Assigning build_neighbour_table() to
+    neighbour_table precomputes a packed grid's table anyway.
+    """
 
     def __init__(self, goal_states, init_state, M, N, grid_map):
         super(GridSearchProblem, self).__init__(goal_states, init_state)
         # Store graph vertices (should be array of unique identifiers, e.g. integers)
         self.M = M
         self.N = N
+        if isinstance(grid_map, np.ndarray):
+            grid_map = grid_map.view()
+            grid_map.flags.writeable = False
         self.grid_map = grid_map
+        self.overlay = {} # state -> occupied, for the cells that differ from grid_map
+        self._goal_buckets = None
+        self._goal_distances = None
+        self._neighbour_table = None
         # Zero the inital and goal states
-        x, y = self.get_position(init_state)
-        self.grid_map[int(x), int(y)] = False
-        for state in goal_states:
+        for state in [init_state] + list(goal_states):
+            if self.grid_map[self.get_position(state)]:
+                self.overlay[int(state)] = False
+
+    @property
+    def neighbour_table(self):
+        if self._neighbour_table is None:
+            if hasattr(self.grid_map, 'unpack_states'): # PackedGrid
+                self._neighbour_table = PackedNeighbourTable(self)
+            else:
+                self._neighbour_table = self.build_neighbour_table()
+        return self._neighbour_table
+
+    @neighbour_table.setter
+    def neighbour_table(self, table):
+        self._neighbour_table = table
+
+    def is_blocked(self, states):
+        # Occupancy of one state (bool) or of a numpy array of states (bool array)
+        if np.ndim(states) == 0:
+            return self.overlay.get(int(states), bool(self.grid_map[self.get_position(states)]))
+        states = np.asarray(states)
+        blocked = np.asarray(self.grid_map[states % self.M, states // self.M], dtype=bool)
+        if self.overlay:
+            changed = np.fromiter(self.overlay.keys(), dtype=np.int64, count=len(self.overlay))
+            values = np.fromiter(self.overlay.values(), dtype=bool, count=len(self.overlay))
+            order = np.argsort(changed)
+            changed, values = changed[order], values[order]
+            positions = np.minimum(np.searchsorted(changed, states), len(changed) - 1)
+            hit = changed[positions] == states
+            blocked[hit] = values[positions[hit]]
+        return blocked
+
+    def occupancy(self, x_start=0, x_end=None, y_start=0, y_end=None):
+        # bool array indexed [x, y] with the occupancy of a rectangle of cells (the whole grid by default)
+        x = np.arange(x_start, self.M if x_end is None else x_end)
+        y = np.arange(y_start, self.N if y_end is None else y_end)
+        return self.is_blocked(y[None, :] * self.M + x[:, None])
+
+    def blocked_states(self):
+        # bool array with the occupancy of every state, in state order (y*M + x)
+        if hasattr(self.grid_map, 'unpack_states'): # PackedGrid
+            blocked = self.grid_map.unpack_states().copy()
+        else:
+            blocked = self.grid_map.ravel(order='F').copy()
+        for state, occupied in self.overlay.items():
+            blocked[state] = occupied
+        return blocked
+
+    def build_neighbour_table(self):
+        # Successor table for the current grid_map, built with one vectorized pass per move direction
+        num_states = self.M * self.N
+        blocked = self.blocked_states()
+        states = np.arange(num_states, dtype=np.int32)
+        x = states % self.M
+        y = states // self.M
+        table = np.full((num_states, 4), -1, dtype=np.int32)
+        moves = ((x + 1 < self.M, 1), (x >= 1, -1), (y + 1 < self.N, self.M), (y >= 1, -self.M))
+        for column, (inside, step) in enumerate(moves):
+            free = inside & ~blocked
+            free[free] = ~blocked[states[free] + step]
+            table[free, column] = states[free] + step
+        return table
+
+    def set_cells(self, changes):
+        """
+        Changes the occupancy of a few cells (in the overlay, grid_map itself is left untouched) and refreshes the
+        neighbour_table rows around them (instead of rebuilding the whole table). A PackedNeighbourTable reads the
+        overlay directly, so it needs no refresh.
+
+        :param changes: iterable of (state, occupied) pairs
+        """
+        affected = set()
+        for state, occupied in changes:
+            self.overlay[int(state)] = bool(occupied)
+            if not isinstance(self._neighbour_table, np.ndarray):
+                continue # not built yet, or computed from the overlay when read
+            affected.add(state)
             x, y = self.get_position(state)
-            self.grid_map[int(x), int(y)] = False
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if 0 <= nx < self.M and 0 <= ny < self.N:
+                    affected.add(self.get_state(nx, ny))
+        for state in affected:
+            x, y = self.get_position(state)
+            row = [-1, -1, -1, -1]
+            if not self.is_blocked(state):
+                for column, (nx, ny) in enumerate(((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))):
+                    if 0 <= nx < self.M and 0 <= ny < self.N and not self.is_blocked(self.get_state(nx, ny)):
+                        row[column] = self.get_state(nx, ny)
+            self.neighbour_table[state] = row
 
     def get_actions(self, state):
-        x, y = self.get_position(state)
-        x = int(x)
-        y = int(y)
-        assert(not self.grid_map[x, y])
-        action_list = []
-        if x + 1 < self.M and not self.grid_map[x+1, y]:
-            action_list.append((state, self.get_state(x+1, y)))
-        if x-1 >= 0 and not self.grid_map[x-1, y]:
-            action_list.append((state, self.get_state(x-1, y)))
-        if y+1 < self.N and not self.grid_map[x, y+1]:
-            action_list.append((state, self.get_state(x, y+1)))
-        if y-1 >= 0 and not self.grid_map[x, y-1]:
-            action_list.append((state, self.get_state(x, y-1)))
-        return action_list
+        assert(not self.is_blocked(state))
+        return [(state, child) for child in self.get_successors(state).tolist()]
+
+    def get_successors(self, state):
+        # numpy array of the states reachable from state in one move
+        row = self.neighbour_table[state]
+        return row[row >= 0]
 
     def get_position(self, state):
         assert (state < self.M * self.N)
-        x = np.mod(state, self.M)
-        y = np.floor(state/ self.M)
-        return x, y
+        return state % self.M, state // self.M
 
     def get_state(self, x, y):
         return y*self.M + x
 
     def heuristic(self, state):
-        return self.manhattan_heuristic(state, self.goal_states[0])
+        # Manhattan distance to the nearest goal
+        if len(self.goal_set) == 1:
+            return self.manhattan_heuristic(state, self.goal_states[0])
+        x, y = self.get_position(state)
+        return self.goal_buckets().nearest(x, y)
+
+    def batch_heuristic(self, states):
+        # Manhattan distances from every state in a numpy array to its nearest goal, in one vectorized call
+        if len(self.goal_set) == 1:
+            return self.batch_manhattan_heuristic(states, self.goal_states[0])
+        return self.nearest_goal_distances()[states]
+
+    def goal_buckets(self):
+        # GoalBuckets index of the goals, built on first use (and again after goal_states is replaced)
+        if self._goal_buckets is None or self._goal_buckets.goal_set is not self.goal_set:
+            self._goal_buckets = GoalBuckets(self.M, self.N, self.goal_set)
+        return self._goal_buckets
+
+    def nearest_goal_distances(self):
+        """
+        Manhattan distance from every state to its nearest goal, ignoring obstacles (so it is an admissible and
+        consistent heuristic). It is the L1 distance transform of the goal cells, computed with a forward and a backward
+        pass along x and then along y, each vectorized over the other axis, and cached until goal_states is replaced.
+
+        :return: numpy int32 array indexed by state
+        """
+        if self._goal_distances is not None and self._goal_distances[0] is self.goal_set:
+            return self._goal_distances[1]
+        far = self.M + self.N # larger than any distance on the grid
+        distance = np.full((self.N, self.M), far, dtype=np.int32) # indexed [y, x], so ravel() is in state order
+        goals = np.fromiter(self.goal_set, dtype=np.int64, count=len(self.goal_set))
+        distance[goals // self.M, goals % self.M] = 0
+        for x in range(1, self.M):
+            np.minimum(distance[:, x], distance[:, x - 1] + 1, out=distance[:, x])
+        for x in range(self.M - 2, -1, -1):
+            np.minimum(distance[:, x], distance[:, x + 1] + 1, out=distance[:, x])
+        for y in range(1, self.N):
+            np.minimum(distance[y], distance[y - 1] + 1, out=distance[y])
+        for y in range(self.N - 2, -1, -1):
+            np.minimum(distance[y], distance[y + 1] + 1, out=distance[y])
+        distance = distance.ravel()
+        self._goal_distances = (self.goal_set, distance)
+        return distance
 
     def manhattan_heuristic(self, state1, state2):
         x1, y1 = self.get_position(state1)
         x2, y2 = self.get_position(state2)
         return abs(x1 - x2) + abs(y1 - y2)
 
+    def batch_manhattan_heuristic(self, states, state2):
+        # Manhattan distances from every state in a numpy array to state2, in one vectorized call
+        x2, y2 = self.get_position(state2)
+        return np.abs(states % self.M - x2) + np.abs(states // self.M - y2)
+
     def plot_solution(self, trajectory):
         fig = plt.figure()
-        plt.imshow(1 - self.grid_map.T, cmap='gray')
+        plt.imshow(1 - self.occupancy().T, cmap='gray')
         x = np.zeros(len(trajectory))
         y = np.zeros(x.shape)
         for idx in range(len(trajectory)):
@@ -202,36 +495,121 @@ class GridSearchProblem(SimpleSearchProblem):
     def check_solution(self, path):
         if not path:
             return False
-        for idx, state in enumerate(path):
-            x, y = self.get_position(state)
-            if self.grid_map[int(x), int(y)]:
-                return False
-            if idx < len(path)-1:
-                action_list = self.get_actions(state)
-                neighbours = list(zip(*action_list))[1]
-                if not neighbours.__contains__(path[idx+1]):
-                    return False
-            if idx == len(path) - 1:
-                if state != self.goal_states[0]:
-                    return False
-            if idx == 0:
-                if state != self.init_state:
-                    return False
-        return True
+        path = np.asarray(path)
+        if path[0] != self.init_state or not self.goal_test(path[-1]):
+            return False
+        assert (np.all(path < self.M * self.N))
+        if np.any(self.is_blocked(path)):
+            return False
+        # every step must be one of the moves listed in the neighbour table
+        return bool(np.all(np.any(self.neighbour_table[path[:-1]] == path[1:, None], axis=1)))
 
 
-def get_random_grid_problem(p_occ, M, N):
+class PackedNeighbourTable:
+    """
+    neighbour_table of a GridSearchProblem over a PackedGrid: the row of a state is computed from the grid bits and the
+    problem's overlay when it is read, in the layout of GridSearchProblem.build_neighbour_table (int32, one column per
+    move +x, -x, +y, -y, -1 for blocked moves). Only the rows a search reads are ever computed, so the memory used stays
+    that of the packed grid. A single state gives a row of shape (4,), a numpy array of states a (len(states), 4) array.
+    """
+    def __init__(self, problem):
+        self.problem = problem
+        self.M = problem.M
+        self.N = problem.N
+        self.bits = memoryview(np.asarray(problem.grid_map.bits)) # fast item reads, also over a memory map
+        self.overlay = problem.overlay # shared, so set_cells is seen right away
+
+    def __len__(self):
+        return self.M * self.N
+
+    def __getitem__(self, states):
+        if np.ndim(states) != 0:
+            return self.rows(np.asarray(states))
+        state = int(states)
+        row = [-1, -1, -1, -1]
+        if not self.blocked(state):
+            x, y = state % self.M, state // self.M
+            for column, (inside, child) in enumerate(((x + 1 < self.M, state + 1), (x >= 1, state - 1),
+                                                      (y + 1 < self.N, state + self.M), (y >= 1, state - self.M))):
+                if inside and not self.blocked(child):
+                    row[column] = child
+        return np.array(row, dtype=np.int32)
+
+    def blocked(self, state):
+        occupied = self.overlay.get(state)
+        if occupied is None:
+            return self.bits[state >> 3] >> (state & 7) & 1
+        return occupied
+
+    def rows(self, states):
+        # Rows of a numpy array of states, computed with one vectorized occupancy test per move direction
+        states = states.astype(np.int64)
+        x, y = states % self.M, states // self.M
+        table = np.full((len(states), 4), -1, dtype=np.int32)
+        free = ~self.problem.is_blocked(states)
+        moves = ((x + 1 < self.M, 1), (x >= 1, -1), (y + 1 < self.N, self.M), (y >= 1, -self.M))
+        for column, (inside, step) in enumerate(moves):
+            open_move = free & inside
+            open_move[open_move] = ~self.problem.is_blocked(states[open_move] + step)
+            table[open_move, column] = states[open_move] + step
+        return table
+
+
+class GoalBuckets:
+    """
+    Index of the goal cells of a grid for nearest-goal Manhattan distance queries. The grid is cut into square buckets
+    of bucket_size cells (about one goal per bucket by default), and the goals are sorted by bucket in CSR form. A
+    query scans rings of buckets around the queried cell, nearest first, and stops as soon as no goal in the next ring
+    can be closer than the best one found.
+    """
+    def __init__(self, M, N, goal_states, bucket_size=None):
+        self.goal_set = goal_states # kept so that GridSearchProblem can tell when its goals were replaced
+        goals = np.fromiter(goal_states, dtype=np.int64, count=len(goal_states))
+        if bucket_size is None:
+            bucket_size = max(int(np.sqrt(M * N / len(goals))), 1)
+        self.bucket_size = bucket_size
+        self.columns = -(-M // bucket_size)
+        self.rows = -(-N // bucket_size)
+        x, y = goals % M, goals // M
+        buckets = (y // bucket_size) * self.columns + x // bucket_size
+        order = np.argsort(buckets, kind='stable')
+        self.x, self.y = x[order].tolist(), y[order].tolist()
+        self.offsets = np.searchsorted(buckets[order], np.arange(self.columns * self.rows + 1)).tolist()
+
+    def nearest(self, x, y):
+        # Manhattan distance from cell (x, y) to the nearest goal
+        size = self.bucket_size
+        column, row = x // size, y // size
+        best = float('inf')
+        for ring in range(max(self.columns, self.rows)):
+            for by in range(max(row - ring, 0), min(row + ring, self.rows - 1) + 1):
+                on_edge = by == row - ring or by == row + ring # middle rows of the ring only have its two ends
+                step = 1 if on_edge else 2 * ring
+                for bx in range(column - ring, column + ring + 1, max(step, 1)):
+                    if bx < 0 or bx >= self.columns:
+                        continue
+                    bucket = by * self.columns + bx
+                    for goal in range(self.offsets[bucket], self.offsets[bucket + 1]):
+                        best = min(best, abs(self.x[goal] - x) + abs(self.y[goal] - y))
+            if best <= ring * size + 1: # every goal in a further ring is at least ring*size + 1 away
+                break
+        return best
+
+
+def get_random_grid_problem(p_occ, M, N, packed=False, num_goals=1):
     """
     Makes a random grid problem of size MxN where each cell has probability 0 <= p_occ <= 1 of being occupied.
     :param p_occ: probability of a cell being occupied (must be within [0.0, 1.0])
     :param M: width (x-dimension) in integer number of cells
     :param N: height (y-dimension) in integer number of cells
+    :param packed: store the grid as a PackedGrid (one bit per cell) instead of a bool array
+    :param num_goals: number of random goal states (any of them ends the search)
     :return: instance of GridSearchProblem
     """
-    grid_map = np.random.rand(M, N) <= p_occ
+    grid_map = PackedGrid.random(p_occ, M, N) if packed else np.random.rand(M, N) <= p_occ
     init_state = np.random.randint(M*N)
-    goal_state = np.random.randint(M*N)
-    problem = GridSearchProblem([goal_state], init_state, M, N, grid_map)
+    goal_states = np.random.randint(M*N, size=num_goals).tolist() if num_goals > 1 else [np.random.randint(M*N)]
+    problem = GridSearchProblem(goal_states, init_state, M, N, grid_map)
     return problem
 
 
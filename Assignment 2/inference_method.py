@@ -1,4 +1,4 @@
-from collections import deque
+import numpy as np
 from support import definite_clause
 
 ### THIS IS THE TEMPLATE FILE
@@ -24,28 +24,76 @@ def pl_fc_entails(symbols_list : list, KB_clauses : list, known_symbols : list,
 
     ### START: Your code
 
-    count = {} # dictionary to hold the number of symbols in each clause
-    for c in KB_clauses:
-        count[c] = len(c.body)
-    inferred = [False for i in range(max(symbols_list)+1)] # everything initially assumed false
-    agenda = known_symbols # agenda queue to follow psuedo code
+    # symbols are remapped to dense ids and every clause body entry is touched once, through the inverted index
+    symbols, body_offsets, body_symbols, index_offsets, index_clauses, conclusions = \
+        index_definite_clauses(KB_clauses, symbols_list, known_symbols, [query])
+    query = int(np.searchsorted(symbols, query))
+    count = np.diff(body_offsets) # number of premises of every clause not known to be true yet
+    inferred = bytearray(len(symbols)) # everything initially assumed false
+    # the agenda starts with the facts (known_symbols is only read) and the clauses that have no premise at all
+    agenda = np.searchsorted(symbols, np.asarray(known_symbols, dtype=np.int64)).tolist()
+    agenda += conclusions[count == 0].tolist()
+    # memoryviews read and write the arrays as plain ints, which is much faster than numpy scalars one at a time
+    count, index_offsets, index_clauses, conclusions = (memoryview(array) for array in
+                                                        (count, index_offsets, index_clauses, conclusions))
 
-    while(agenda): # loop while the agenda queue is not empty
+    while agenda: # loop while the agenda stack is not empty
         p = agenda.pop()
         if p == query:
             return True # if the symbol is in the query inputted, then it must be true
-        elif inferred[p] == False:
-            inferred[p] = True # change inferred from false to true since we now know its state
-            for c in KB_clauses: # loop through the various clauses
-                if p in c.body:
-                    count[c] -= 1 # update the number of symbols as the loop continues
-                    if count[c] == 0:
-                        agenda.append(c.conclusion) # all symbols are true --> conclusion is now known
-
-    return False # remove line if needed
+        if not inferred[p]:
+            inferred[p] = 1 # change inferred from false to true since we now know its state
+            for c in index_clauses[index_offsets[p]:index_offsets[p + 1]]: # only the clauses with p as a premise
+                count[c] -= 1 # update the number of symbols as the loop continues
+                if count[c] == 0:
+                    agenda.append(conclusions[c]) # all symbols are true --> conclusion is now known
+
+    return False
     ### END: Your code
 
 
+def index_definite_clauses(KB_clauses, *symbol_lists):
+    """
+    Compiles definite clauses into flat numpy arrays over dense symbol ids.
+
+    :param KB_clauses: list of definite_clause(s)
+    :param symbol_lists: lists of further symbols to include in the remap (e.g. the symbols list, facts and query)
+    :return: symbols: sorted unique symbols (dense id i is symbol symbols[i])
+             body_offsets, body_symbols: CSR clause bodies; the distinct premises of clause c are the dense ids
+                                         body_symbols[body_offsets[c]:body_offsets[c+1]] (duplicates are dropped)
+             index_offsets, index_clauses: inverted index; the clauses with symbol s as a premise are
+                                           index_clauses[index_offsets[s]:index_offsets[s+1]]
+             conclusions: dense id of the conclusion of every clause
+    """
+    lengths = np.array([len(clause.body) for clause in KB_clauses], dtype=np.int64)
+    premises = np.fromiter((symbol for clause in KB_clauses for symbol in clause.body), dtype=np.int64,
+                           count=int(lengths.sum()))
+    conclusions = np.array([clause.conclusion for clause in KB_clauses], dtype=np.int64)
+    symbols = sorted_unique(np.concatenate([premises, conclusions] +
+                                           [np.asarray(symbol_list, dtype=np.int64) for symbol_list in symbol_lists]))
+    num_clauses, num_symbols = len(KB_clauses), len(symbols)
+
+    # (clause, premise) pairs sorted by clause then premise, without duplicates
+    pairs = sorted_unique(np.repeat(np.arange(num_clauses), lengths) * num_symbols + np.searchsorted(symbols, premises))
+    body_clauses, body_symbols = pairs // num_symbols, pairs % num_symbols
+    body_offsets = np.zeros(num_clauses + 1, dtype=np.int64)
+    np.cumsum(np.bincount(body_clauses, minlength=num_clauses), out=body_offsets[1:])
+
+    order = np.argsort(body_symbols, kind='stable')
+    index_clauses = body_clauses[order]
+    index_offsets = np.zeros(num_symbols + 1, dtype=np.int64)
+    np.cumsum(np.bincount(body_symbols, minlength=num_symbols), out=index_offsets[1:])
+    return symbols, body_offsets, body_symbols, index_offsets, index_clauses, np.searchsorted(symbols, conclusions)
+
+
+def sorted_unique(values):
+    # Same as np.unique for a 1-D int array, with a plain sort (faster than the default hashing for large arrays)
+    values = np.sort(values)
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+
 # SAMPLE TEST
 if __name__ == '__main__':
 
@@ -32,25 +32,18 @@ def initialize_greedy_n_queens(N: int) -> list:
     greedy_init[0] = np.random.randint(0, N)
 
     ### YOUR CODE GOES HERE
-    diagonal_1 = np.zeros(2*N) # diagonals going from left to right --> queens along these types of diagonals share the property where their row number minus column number remain constant
+    diagonal_1 = np.zeros(2*N, dtype=int) # diagonals going from left to right --> queens along these types of diagonals share the property where their row number minus column number remain constant
     diagonal_1[greedy_init[0] + N] += 1 # N is added for indexing purposes
-    diagonal_2 = np.zeros(2*N) # diagonals going from right to left --> queens along these types of diagonals share the property where their row number plus column number remain constant
+    diagonal_2 = np.zeros(2*N, dtype=int) # diagonals going from right to left --> queens along these types of diagonals share the property where their row number plus column number remain constant
     diagonal_2[greedy_init[0]] += 1
-    rows = np.zeros(N) # keeps track of the number of queens in each row of the board
+    rows = np.zeros(N, dtype=int) # keeps track of the number of queens in each row of the board
     rows[greedy_init[0]] += 1
 
     for i in range(1,N): # loop from the first to last column, since the 0th column was already taken care of
-        min_row_numbers = [0]
-        min_conflicts = rows[0] + diagonal_1[-i+N] + diagonal_2[i] # the first row we see will have minimal conflicts since it if the first one --> update the row number of number of conflicts accordingly
-        for j in range(1,N):
-            conflicts = rows[j] + diagonal_1[j-i+N] + diagonal_2[j+i] # determine the conflicts of the position we are in
-            if conflicts < min_conflicts: # update data if the position has the least number of columns
-                min_row_numbers = [j]
-                min_conflicts = conflicts
-            elif conflicts == min_conflicts: # add to the list if the position has the same number of conflicts as the previous minimum
-                min_row_numbers.append(j)
-        index = np.random.randint(len(min_row_numbers))
-        greedy_init[i] = min_row_numbers[index] # pick a random index from the minimum rows
+        # conflicts of every row of column i at once: row j lies on diagonals j-i+N and j+i, so both are contiguous slices
+        conflicts = rows + diagonal_1[N-i:2*N-i] + diagonal_2[i:i+N]
+        min_row_numbers = np.flatnonzero(conflicts == conflicts.min())
+        greedy_init[i] = min_row_numbers[np.random.randint(len(min_row_numbers))] # pick a random row among the minimum ones
         diagonal_1[greedy_init[i] - i + N] += 1
         diagonal_2[greedy_init[i] + i] += 1
         rows[greedy_init[i]] += 1 # update the diagonal and row lists accordingly
@@ -58,6 +51,69 @@ def initialize_greedy_n_queens(N: int) -> list:
     return greedy_init
 
 
+def initialize_randomized_greedy_n_queens(N: int, max_tries: int = 64) -> list:
+    """
+    Same greedy assignment as initialize_greedy_n_queens (every column gets a uniformly random row among the ones with
+    the fewest conflicts), built in O(N) expected time instead of evaluating all N rows of every column.
+
+    While conflict-free rows remain, a column tries random rows that no queen uses yet until one of them is on two free
+    diagonals: any row with zero conflicts is among the unused ones, so the accepted row is uniform over the
+    conflict-free rows, as a random tie-break among them would be. Only when max_tries samples all fail (near the last
+    columns, where free rows are scarce) is the whole column evaluated with the vectorized expression of
+    initialize_greedy_n_queens.
+
+    :param N: integer representing the size of the NxN chessboard
+    :param max_tries: number of random rows tried for a column before it is evaluated in full
+    :return: numpy array of shape (N,) containing an initial solution using greedy min-conflicts (see
+             initialize_greedy_n_queens)
+    """
+    greedy_init = [0] * N # plain lists in the sampling loop, numpy scalar access is slow
+    on_diagonal_1 = [0] * (2*N) # row - column + N
+    on_diagonal_2 = [0] * (2*N) # row + column
+    # numpy counts for full column evaluations, only brought up to date from greedy_init when one is needed
+    diagonal_1 = np.zeros(2*N, dtype=int)
+    diagonal_2 = np.zeros(2*N, dtype=int)
+    rows = np.zeros(N, dtype=int)
+    counted = 0 # columns already added to the numpy counts
+    free_rows = list(range(N)) # rows with no queen, in any order
+    position = list(range(N)) # index of every free row in free_rows (for constant-time removal)
+    samples = [] # random numbers in [0, 1), drawn in blocks
+    sample = 0
+
+    for i in range(N):
+        row = -1
+        num_free = len(free_rows)
+        for attempt in range(min(max_tries, num_free)):
+            if sample == len(samples):
+                samples = np.random.random(4096).tolist()
+                sample = 0
+            candidate = free_rows[int(samples[sample] * num_free)]
+            sample += 1
+            if on_diagonal_1[candidate - i + N] == 0 and on_diagonal_2[candidate + i] == 0:
+                row = candidate
+                break
+        if row < 0: # no conflict-free row found by sampling: evaluate the whole column
+            placed = np.array(greedy_init[counted:i], dtype=int)
+            np.add.at(rows, placed, 1)
+            np.add.at(diagonal_1, placed - np.arange(counted, i) + N, 1)
+            np.add.at(diagonal_2, placed + np.arange(counted, i), 1)
+            counted = i
+            conflicts = rows + diagonal_1[N-i:2*N-i] + diagonal_2[i:i+N]
+            min_row_numbers = np.flatnonzero(conflicts == conflicts.min())
+            row = int(min_row_numbers[np.random.randint(len(min_row_numbers))])
+        greedy_init[i] = row
+        on_diagonal_1[row - i + N] += 1
+        on_diagonal_2[row + i] += 1
+        index = position[row]
+        if index < len(free_rows) and free_rows[index] == row: # swap with the last free row and drop it
+            last = free_rows.pop()
+            if last != row:
+                free_rows[index] = last
+                position[last] = index
+
+    return np.array(greedy_init, dtype=int)
+
+
 if __name__ == '__main__':
     sol = initialize_greedy_n_queens(6)
-    print(sol)
\ No newline at end of file
+    print(sol)
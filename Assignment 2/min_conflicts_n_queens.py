@@ -30,52 +30,116 @@ def min_conflicts_n_queens(initialization: list) -> (list, int):
              num_steps - number of steps (i.e. reassignment of 1 queen's position) required to find the solution.
     """
 
-    N = len(initialization)
-    solution = initialization.copy()
+    solution = np.array(initialization, dtype=int)
     num_steps = 0
     max_steps = 1000
-
-    diagonal_1 = np.zeros(2*N) # diagonals going from left to right --> queens along these types of diagonals share the property where their row number minus column number remain constant
-    diagonal_2 = np.zeros(2*N) # diagonals going from right to left --> queens along these types of diagonals share the property where their row number plus column number remain constant
-    rows = np.zeros(N) # keeps track of the number of queens in each row of the board
-
-    for column in range(N): # update the diagonal and row arrays based on the greedy n queens initialization
-        rows[initialization[column]] += 1
-        diagonal_1[initialization[column] - column + N] += 1
-        diagonal_2[initialization[column] + column] += 1
+    engine = ConflictEngine(solution)
 
     for idx in range(max_steps):
-        if max(rows) == 1 and max(diagonal_1) == 1 and max(diagonal_2) == 1: # if there are no conflicts in the arrays, then the algorithm is complete
+        if engine.excess == 0: # if there are no conflicts left, then the algorithm is complete
             return solution, idx
-        while True:
-            column = np.random.randint(0,N)
-            row = solution[column] # choose a random queen on the board
-            if rows[row] > 1 or diagonal_1[row - column + N] > 1 or diagonal_2[row + column] > 1: # check to make sure a conflict exists --> if it does, break out of the loop
-                break
-        optimize(N, column, rows, diagonal_1, diagonal_2, row, solution) # calls the optimization function --> follows a similar logic to the greedy choice
+        column = engine.conflicted[np.random.randint(len(engine.conflicted))] # choose a random conflicted queen
+        engine.move(column, engine.best_row(column)) # same logic as the greedy choice
         num_steps += 1
+    if engine.excess == 0:
+        return solution, num_steps
     return [], -1
 
-def optimize(N, column, rows, diagonal_1, diagonal_2, old_row, solution): # very similar code to the greedy choice --> also updates the arrays at the end based on the new position
-    min_row_numbers = [0]
-    min_conflicts = rows[0] + diagonal_1[-column+N] + diagonal_2[column]
-    for j in range(1,N):
-        conflicts = rows[j] + diagonal_1[j-column+N] + diagonal_2[j+column]
-        if conflicts < min_conflicts:
-            min_row_numbers = [j]
-            min_conflicts = conflicts
-        elif conflicts == min_conflicts:
-            min_row_numbers.append(j)
-    index = np.random.randint(len(min_row_numbers))
-    new_row = min_row_numbers[index]
-    rows[old_row] -= 1 # subtracts 1 from the old position since the queen is not placed at another position
-    diagonal_1[old_row - column + N] -= 1
-    diagonal_2[old_row + column] -= 1
-
-    solution[column] = new_row #  updates the solution to the new position chosen
-    rows[new_row] += 1 # adds 1 to the new position of the arrays
-    diagonal_1[new_row - column + N] += 1
-    diagonal_2[new_row + column] += 1
+
+class ConflictEngine:
+    """
+    Incremental conflict bookkeeping for min-conflicts on an N-queens assignment (updated in place through move).
+
+    Besides the number of queens on every row and diagonal, it keeps:
+    - excess: the number of queens beyond the first on every line, summed over all lines (0 exactly when the board has
+      no conflicts), so the termination test is O(1)
+    - conflicted: the columns whose queen shares a line with another one, as a swap-remove list with position giving
+      the index of each column in it (-1 if absent), so a random conflicted queen is picked in O(1)
+    - the XOR of the columns of the queens on every line, which is the column of the only queen on a line that holds
+      one, so the queen left alone or newly attacked by a move is found without a scan
+    Only best_row, which evaluates all N rows of a column with numpy, is not constant time.
+    """
+    def __init__(self, solution):
+        self.solution = solution
+        N = len(solution)
+        self.N = N
+        columns = np.arange(N)
+        self.rows = np.bincount(solution, minlength=N) # queens in every row
+        self.diagonal_1 = np.bincount(solution - columns + N, minlength=2*N) # row - column + N is constant
+        self.diagonal_2 = np.bincount(solution + columns, minlength=2*N) # row + column is constant
+        self.occupants = []
+        for counts, lines in ((self.rows, solution), (self.diagonal_1, solution - columns + N),
+                              (self.diagonal_2, solution + columns)):
+            occupant = np.zeros(len(counts), dtype=int)
+            np.bitwise_xor.at(occupant, lines, columns)
+            self.occupants.append(occupant)
+        self.excess = int(sum(np.maximum(counts - 1, 0).sum() for counts in (self.rows, self.diagonal_1,
+                                                                            self.diagonal_2)))
+        self.conflicted = np.flatnonzero(self.attacked(columns)).tolist()
+        self.position = [-1] * N
+        for index, column in enumerate(self.conflicted):
+            self.position[column] = index
+
+    def attacked(self, columns):
+        # Whether the queen of each column shares a line with another queen (columns is an int or a numpy array)
+        row = self.solution[columns]
+        return (self.rows[row] > 1) | (self.diagonal_1[row - columns + self.N] > 1) | \
+            (self.diagonal_2[row + columns] > 1)
+
+    def best_row(self, column):
+        """
+        Row with the fewest conflicts for the queen of column (evaluated with the queen still in place, as the greedy
+        initialization does), ties broken uniformly at random.
+        """
+        N = self.N
+        # row j of the column lies on diagonals j-column+N and j+column, so both are contiguous slices
+        conflicts = self.rows + self.diagonal_1[N-column:2*N-column] + self.diagonal_2[column:column+N]
+        min_row_numbers = np.flatnonzero(conflicts == conflicts.min())
+        return int(min_row_numbers[np.random.randint(len(min_row_numbers))])
+
+    def move(self, column, new_row):
+        # Moves the queen of column to new_row and updates every count, the excess and the conflicted set
+        old_row = int(self.solution[column])
+        if new_row == old_row:
+            return
+        N = self.N
+        lines = ((self.rows, self.occupants[0], old_row, new_row),
+                 (self.diagonal_1, self.occupants[1], old_row - column + N, new_row - column + N),
+                 (self.diagonal_2, self.occupants[2], old_row + column, new_row + column))
+        recheck = [column]
+        for counts, occupant, old_line, new_line in lines:
+            counts[old_line] -= 1
+            occupant[old_line] ^= column
+            if counts[old_line] >= 1:
+                self.excess -= 1
+                if counts[old_line] == 1: # the queen left on this line may no longer be attacked
+                    recheck.append(int(occupant[old_line]))
+            if counts[new_line] >= 1:
+                self.excess += 1
+                if counts[new_line] == 1: # the queen already on this line is now attacked
+                    self.add_conflicted(int(occupant[new_line]))
+            counts[new_line] += 1
+            occupant[new_line] ^= column
+        self.solution[column] = new_row
+        for other in recheck:
+            if self.attacked(other):
+                self.add_conflicted(other)
+            else:
+                self.remove_conflicted(other)
+
+    def add_conflicted(self, column):
+        if self.position[column] < 0:
+            self.position[column] = len(self.conflicted)
+            self.conflicted.append(column)
+
+    def remove_conflicted(self, column):
+        index = self.position[column]
+        if index >= 0: # swap with the last conflicted column and drop it
+            last = self.conflicted.pop()
+            if last != column:
+                self.conflicted[index] = last
+                self.position[last] = index
+            self.position[column] = -1
 
 if __name__ == '__main__':
     # Test your code here!
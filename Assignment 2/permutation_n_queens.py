@@ -0,0 +1,218 @@
+import numpy as np
+
+
+def permutation_n_queens(N: int, max_steps: int = 1000, free_columns: int = 32) -> (list, int):
+    """
+    Solve the N-queens problem with a permutation representation and queen swaps (Sosic & Gu's QS4). The rows of the
+    queens are always a permutation of 0..N-1, so only diagonal conflicts can occur, and a move swaps the rows of two
+    queens, which keeps the permutation.
+
+    The initial permutation is built column by column: the queen of column i is swapped with a random later queen until
+    it sits on two free diagonals, except for the last free_columns columns, which keep their random rows. The final
+    search then takes the queens that are still attacked and swaps each of them with a random queen whenever that lowers
+    the number of attacking pairs, until none is left. If a few passes over the attacked queens find no improving swap,
+    the search restarts from a new permutation.
+
+    The rows and the diagonal counts are int32 numpy arrays; the Python loops go through memoryviews of them, whose
+    items are read and written as plain ints, and the attacked queens are found with vectorized passes.
+
+    :param N: integer representing the size of the NxN chessboard
+    :param max_steps: limit on the number of swaps made by the final search (over all restarts)
+    :param free_columns: number of columns left random by the initial placement
+    :return: solution - numpy array of shape (N,) containing a conflict-free assignment of queens (i-th entry represents
+                        the row of the i-th column, indexed from 0 to N-1)
+             num_steps - number of swaps made by the final search
+             or ([], -1) when no solution was found within max_steps swaps
+    """
+    num_steps = 0
+    while num_steps <= max_steps:
+        queens = np.arange(N, dtype=np.int32)
+        np.random.shuffle(queens) # in place, without the int64 copy of np.random.permutation
+        diagonal_1 = np.zeros(max(2*N - 1, 1), dtype=np.int32) # row - column + N - 1 is constant
+        diagonal_2 = np.zeros(max(2*N - 1, 1), dtype=np.int32) # row + column is constant
+        place_queens(queens, diagonal_1, diagonal_2, N - min(free_columns, N))
+        collisions = 0 # pairs of queens attacking each other
+        for counts in (diagonal_1, diagonal_2):
+            shared = counts[counts > 1].astype(np.int64) # only the few shared diagonals, no full-size temporary
+            collisions += int((shared * (shared - 1) // 2).sum())
+        queen, down, up = memoryview(queens), memoryview(diagonal_1), memoryview(diagonal_2)
+        samples = []
+        sample = 0
+        stalled = 0
+        while collisions > 0 and num_steps <= max_steps and stalled < 4:
+            attacked = attacked_columns(queens, diagonal_1, diagonal_2)
+            improved = False
+            for i in attacked.tolist():
+                row_i = queen[i]
+                if down[row_i - i + N - 1] == 1 and up[row_i + i] == 1:
+                    continue # freed by an earlier swap of this pass
+                for attempt in range(64): # a queen with no easy improving swap waits for the next pass
+                    if sample == len(samples):
+                        samples = np.random.randint(N, size=4096).tolist()
+                        sample = 0
+                    j = samples[sample]
+                    sample += 1
+                    if j == i:
+                        continue
+                    row_j = queen[j]
+                    # remove both queens, then put them back on each other's rows, adding up the change in collisions
+                    change = 2 - down[row_i - i + N - 1] - up[row_i + i]
+                    down[row_i - i + N - 1] -= 1
+                    up[row_i + i] -= 1
+                    change += 2 - down[row_j - j + N - 1] - up[row_j + j]
+                    down[row_j - j + N - 1] -= 1
+                    up[row_j + j] -= 1
+                    change += down[row_j - i + N - 1] + up[row_j + i]
+                    down[row_j - i + N - 1] += 1
+                    up[row_j + i] += 1
+                    change += down[row_i - j + N - 1] + up[row_i + j]
+                    down[row_i - j + N - 1] += 1
+                    up[row_i + j] += 1
+                    if change < 0:
+                        queen[i], queen[j] = row_j, row_i
+                        collisions += change
+                        num_steps += 1
+                        improved = True
+                        break
+                    # undo the swap
+                    down[row_i - j + N - 1] -= 1
+                    up[row_i + j] -= 1
+                    down[row_j - i + N - 1] -= 1
+                    up[row_j + i] -= 1
+                    down[row_j - j + N - 1] += 1
+                    up[row_j + j] += 1
+                    down[row_i - i + N - 1] += 1
+                    up[row_i + i] += 1
+                if collisions == 0 or num_steps > max_steps:
+                    break
+            stalled = 0 if improved else stalled + 1
+        del queen, down, up # release the buffers of the arrays
+        if collisions == 0:
+            return queens, num_steps
+        if N <= 3 or num_steps > max_steps:
+            break
+        num_steps += 1 # a restart counts as a step, so the loop always ends
+    return [], -1
+
+
+def attacked_columns(queens, diagonal_1, diagonal_2, chunk_size=1 << 20):
+    # Columns whose queen shares a diagonal with another one, found a chunk of columns at a time to bound temporaries
+    N = len(queens)
+    attacked = []
+    for start in range(0, N, chunk_size):
+        rows = queens[start:start + chunk_size]
+        columns = np.arange(start, start + len(rows), dtype=np.int32)
+        hit = (diagonal_1[rows - columns + N - 1] > 1) | (diagonal_2[rows + columns] > 1)
+        attacked.append(np.flatnonzero(hit) + start)
+    return np.concatenate(attacked) if attacked else np.zeros(0, dtype=int)
+
+
+def place_queens(queens, diagonal_1, diagonal_2, num_placed):
+    """
+    Initial placement of QS4: for the first num_placed columns, swaps the queen of column i with random queens of
+    columns i..N-1 until it is on two free diagonals, then adds every queen to the diagonal counts. Free rows only
+    become rare in the last few columns, so the tries are capped to keep those from taking O(N) each.
+
+    :param queens: int32 permutation of the rows (modified in place)
+    :param diagonal_1: int32 counts of the row - column + N - 1 diagonals (all zero on entry, filled in place)
+    :param diagonal_2: int32 counts of the row + column diagonals (all zero on entry, filled in place)
+    :param num_placed: number of columns placed on free diagonals when possible
+    """
+    N = len(queens)
+    queen, down, up = memoryview(queens), memoryview(diagonal_1), memoryview(diagonal_2)
+    samples = []
+    sample = 0
+    for i in range(num_placed):
+        for attempt in range(1024):
+            if sample == len(samples):
+                samples = np.random.random(4096).tolist()
+                sample = 0
+            j = i + int(samples[sample] * (N - i))
+            sample += 1
+            row = queen[j]
+            if down[row - i + N - 1] == 0 and up[row + i] == 0:
+                queen[i], queen[j] = row, queen[i]
+                break
+        row = queen[i]
+        down[row - i + N - 1] += 1
+        up[row + i] += 1
+    del queen, down, up
+    rest = np.arange(num_placed, N)
+    np.add.at(diagonal_1, queens[rest] - rest + N - 1, 1)
+    np.add.at(diagonal_2, queens[rest] + rest, 1)
+
+
+def run_solver(solver, N, results):
+    """
+    Solves one instance in a child process and reports the time and the peak memory growth of the process (the
+    maximum resident set size after solving minus the one before), so every measurement starts from a fresh heap.
+    """
+    import resource
+    import time
+    from min_conflicts_n_queens import min_conflicts_n_queens
+    from initialize_greedy_n_queens import initialize_greedy_n_queens, initialize_randomized_greedy_n_queens
+
+    np.random.seed(N)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    if solver == 'permutation':
+        solution, num_steps = permutation_n_queens(N)
+    else:
+        initialize = initialize_greedy_n_queens if solver == 'greedy' else initialize_randomized_greedy_n_queens
+        solution, num_steps = min_conflicts_n_queens(initialize(N))
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    valid = num_steps >= 0 and all(len(np.unique(lines)) == N for lines in
+                                   (solution, solution - np.arange(N), solution + np.arange(N)))
+    results.put((elapsed, peak / 1024, num_steps, valid))
+
+
+def compare_solvers(sizes=(1000, 10000, 100000, 1000000, 10000000), greedy_limit=10000, randomized_limit=1000000):
+    """
+    Sweeps N and prints the time, the peak memory growth (MB), the number of steps and whether the solution is valid
+    for permutation_n_queens and for initialize_greedy_n_queens + min_conflicts_n_queens (the greedy initialization is
+    quadratic, so it only runs up to greedy_limit; its O(N)-expected randomized version runs up to randomized_limit).
+    Every run is made in a fresh process.
+    """
+    from multiprocessing import Process, Queue
+
+    print("       N   solver                              time (s)   memory (MB)    steps   valid")
+    for N in sizes:
+        for solver, limit in (('permutation', float('inf')), ('greedy', greedy_limit),
+                              ('randomized greedy', randomized_limit)):
+            if N > limit:
+                continue
+            results = Queue()
+            process = Process(target=run_solver, args=(solver, N, results))
+            process.start()
+            elapsed, memory, num_steps, valid = results.get()
+            process.join()
+            name = solver if solver == 'permutation' else solver + ' + min-conflicts'
+            print("{:8}   {:34}   {:8.2f}   {:11.1f}   {:6}   {:}".format(N, name, elapsed, memory, num_steps, valid))
+
+
+def compare_initializers(greedy_sizes=(1000, 10000), randomized_sizes=(10000, 1000000)):
+    """
+    Times initialize_greedy_n_queens and initialize_randomized_greedy_n_queens on their own (the template file of the
+    initializers keeps its imports, so the timing lives here), and prints the number of queens of each randomized
+    initialization that share a row or diagonal with another one.
+    """
+    import time
+    from initialize_greedy_n_queens import initialize_greedy_n_queens, initialize_randomized_greedy_n_queens
+
+    for N in greedy_sizes:
+        start = time.time()
+        initialize_greedy_n_queens(N)
+        print("N = {:}: vectorized greedy {:.2f} s".format(N, time.time() - start))
+    for N in randomized_sizes:
+        start = time.time()
+        solution = initialize_randomized_greedy_n_queens(N)
+        extra = sum(N - len(np.unique(lines)) for lines in (solution, solution - np.arange(N), solution + np.arange(N)))
+        print("N = {:}: randomized greedy {:.2f} s, {:} queens sharing a line".format(N, time.time() - start, extra))
+
+
+if __name__ == '__main__':
+    solution, num_steps = permutation_n_queens(8)
+    print(solution, num_steps)
+    compare_initializers()
+    compare_solvers()
@@ -0,0 +1,140 @@
+import time
+from multiprocessing import Process, Queue
+from queue import Empty
+import numpy as np
+from initialize_greedy_n_queens import initialize_greedy_n_queens, initialize_randomized_greedy_n_queens
+from min_conflicts_n_queens import min_conflicts_n_queens
+
+
+def portfolio_n_queens(N: int, attempts: int = 8, processes: int = 4, seed: int = 0, randomized: bool = False):
+    """
+    Runs independently seeded greedy initialization + min-conflicts attempts, each in its own worker process with at
+    most `processes` of them at a time, and returns the first conflict-free board found; the attempts still running are
+    then terminated and the ones still waiting are never started. Since min_conflicts_n_queens gives up after 1000
+    steps, restarting is what makes a solution likely, and running the restarts side by side cuts the tail of the solve
+    time rather than its mean.
+
+    :param N: integer representing the size of the NxN chessboard
+    :param attempts: number of attempts (each one gets its own seed, derived from seed)
+    :param processes: number of worker processes (None or 1 runs the attempts one after the other in this process)
+    :param seed: seed the attempt seeds are spawned from
+    :param randomized: use initialize_randomized_greedy_n_queens (O(N) expected) instead of initialize_greedy_n_queens
+    :return: solution - numpy array of shape (N,) containing a conflict-free assignment ([] if every attempt failed)
+             num_steps - number of steps of the successful attempt (-1 if every attempt failed)
+             records - one dictionary per attempt with its 'seed', 'status' ('solved', 'failed' or 'cancelled' for the
+                       attempts that were terminated or never started), 'steps' (-1 unless solved), 'init_time' and
+                       'solve_time' (seconds spent in each phase by the worker, None when cancelled) and 'latency'
+                       (seconds from the start of the portfolio to the moment the result was received or the attempt
+                       was cancelled); finished attempts come first, in order of completion
+    """
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(attempts)]
+    jobs = [(N, attempt_seed, randomized) for attempt_seed in seeds]
+    records = {}
+    start = time.perf_counter()
+    solution, num_steps = [], -1
+    if processes is None or processes <= 1:
+        for index, job in enumerate(jobs):
+            solution, num_steps, record = run_attempt(job)
+            record['latency'] = time.perf_counter() - start
+            records[index] = record
+            if num_steps >= 0:
+                break
+        return solution, num_steps, finish_records(records, seeds, start)
+
+    results = Queue()
+    pending = list(range(attempts))
+    running = {} # attempt index -> Process
+    try:
+        while pending or running:
+            while pending and len(running) < processes:
+                index = pending.pop(0)
+                running[index] = Process(target=report_attempt, args=(results, index, jobs[index]), daemon=True)
+                running[index].start()
+            try:
+                index, attempt_solution, attempt_steps, record = results.get(timeout=0.1)
+            except Empty:
+                # a worker that exited with an error never reports, so waiting for it would hang
+                failed = [worker.exitcode for worker in running.values() if worker.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError("a portfolio worker exited with code {:}".format(failed[0]))
+                continue
+            running.pop(index).join()
+            record['latency'] = time.perf_counter() - start
+            records[index] = record
+            if attempt_steps >= 0:
+                solution, num_steps = attempt_solution, attempt_steps
+                break
+    finally:
+        # the losing attempts are stopped right away instead of running to their own step limit
+        for worker in running.values():
+            worker.terminate()
+        for worker in running.values():
+            worker.join()
+    return solution, num_steps, finish_records(records, seeds, start)
+
+
+def finish_records(records, seeds, start):
+    # Lists the records of the finished attempts in order of completion, followed by one for every cancelled attempt
+    latency = time.perf_counter() - start
+    cancelled = [{'seed': attempt_seed, 'status': 'cancelled', 'steps': -1, 'init_time': None, 'solve_time': None,
+                  'latency': latency} for index, attempt_seed in enumerate(seeds) if index not in records]
+    return list(records.values()) + cancelled
+
+
+def report_attempt(results, index, job):
+    # Worker process body: runs one attempt and puts its result, tagged with the attempt index, on the results queue
+    results.put((index,) + run_attempt(job))
+
+
+def run_attempt(job):
+    """
+    One attempt of the portfolio.
+
+    :param job: tuple (N, seed, randomized)
+    :return: tuple (solution, num_steps, record) as returned by min_conflicts_n_queens, with the record of the attempt
+    """
+    N, seed, randomized = job
+    np.random.seed(seed)
+    start = time.perf_counter()
+    initialization = initialize_randomized_greedy_n_queens(N) if randomized else initialize_greedy_n_queens(N)
+    init_time = time.perf_counter() - start
+    solution, num_steps = min_conflicts_n_queens(initialization)
+    record = {'seed': seed, 'status': 'solved' if num_steps >= 0 else 'failed', 'steps': num_steps,
+              'init_time': init_time, 'solve_time': time.perf_counter() - start - init_time}
+    return solution, num_steps, record
+
+
+def latency_percentiles(N, runs=20, attempts=8, processes=4, randomized=False):
+    """
+    Compares the time to a solution of single attempts (restarted serially after a failure, as a caller of
+    min_conflicts_n_queens would) with the portfolio, over several runs, and prints the median, 95th percentile and
+    maximum of each.
+    """
+    single = []
+    portfolio = []
+    for run in range(runs):
+        start = time.perf_counter()
+        portfolio_n_queens(N, attempts=attempts, processes=1, seed=run, randomized=randomized)
+        single.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        portfolio_n_queens(N, attempts=attempts, processes=processes, seed=run, randomized=randomized)
+        portfolio.append(time.perf_counter() - start)
+    for name, times in (('serial restarts', single), ('portfolio', portfolio)):
+        p50, p95 = np.percentile(times, [50, 95])
+        print("N = {:}, {:16}: median {:.3f} s, p95 {:.3f} s, max {:.3f} s".format(N, name, p50, p95, max(times)))
+
+
+def smoke_test(runs=20, N=1000, attempts=8, processes=4):
+    # Runs the portfolio many times in a row, so that workers that fail to shut down show up as a hang
+    start = time.perf_counter()
+    solved = sum(portfolio_n_queens(N, attempts=attempts, processes=processes, seed=run)[1] >= 0 for run in range(runs))
+    print("{:} portfolio runs finished in {:.2f} s, {:} solved".format(runs, time.perf_counter() - start, solved))
+
+
+if __name__ == '__main__':
+    solution, num_steps, records = portfolio_n_queens(10000, attempts=8, processes=4)
+    print("Solved in {:} steps: {:}".format(num_steps, len(solution) == 10000))
+    for record in records:
+        print(record)
+    latency_percentiles(1000, runs=20)
+    smoke_test()